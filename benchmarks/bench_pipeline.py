@@ -0,0 +1,267 @@
+"""Benchmarks for the projection and render pipeline.
+
+Run from the repository root::
+
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --compare results.json
+
+The GUI benchmarks run under Qt's offscreen platform, so no window is shown.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import numpy as np  # noqa: E402
+
+from core.constants import r, LINE_SAMPLES  # noqa: E402
+from core.geometry import GeometryStore, longitude_family  # noqa: E402
+from core.projection import (  # noqa: E402
+    PROJECTIONS,
+    ProjectionWorkspace,
+    get_projection,
+    get_rotation_matrices,
+    project_points,
+    rotate_sphere_fast,
+)
+
+SET_COUNTS = (1, 8, 32)
+DIVISION_COUNTS = (1, 16, 64, 128)
+QUICK_SET_COUNTS = (1, 8)
+QUICK_DIVISION_COUNTS = (1, 16)
+
+
+def time_call(func, repeat, number=1):
+    """Return per-call timings (seconds) of ``func`` over ``repeat`` rounds."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def summarize(name, params, timings):
+    """Build one machine-readable result record."""
+    return {
+        'name': name,
+        'params': params,
+        'repeat': len(timings),
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.fmean(timings),
+    }
+
+
+def scene_directions(n_sets):
+    """Spread ``n_sets`` family poles deterministically over the sphere."""
+    golden = np.pi * (3 - np.sqrt(5))
+    k = np.arange(n_sets)
+    theta = np.degrees(np.arccos(1 - 2 * (k + 0.5) / n_sets))
+    phi = np.degrees((k * golden) % (2 * np.pi))
+    return [(round(float(t), 1), round(float(p), 1)) for t, p in zip(theta, phi)]
+
+
+def check_partial_rotate(store, R):
+    """Check that rotating after a one-set edit rotates only the edited block."""
+    store.rotate(R)
+    before = store.rotated.copy()
+    store.add(0, store.line_views(0, rotated=False))
+    other = get_rotation_matrices(0.5, 0.1, 0.7)
+    rotated = store.rotate(other, [0])
+    start, stop = store.block_range(0)
+    expected = before.copy()
+    expected[start:stop] = store.coords[start:stop] @ other.T.astype(store.dtype)
+    if not np.allclose(rotated, expected, atol=1e-5):
+        raise AssertionError('GeometryStore.rotate touched blocks other than the edited one')
+    store.rotate(R)
+
+
+def bench_math(repeat, set_counts, division_counts):
+    """Benchmark the Qt-free rotation, projection and geometry functions."""
+    results = []
+    R = get_rotation_matrices(0.3, 0.2, 0.1)
+    results.append(summarize(
+        'get_rotation_matrices', {},
+        time_call(lambda: get_rotation_matrices(0.3, 0.2, 0.1), repeat, number=1000),
+    ))
+
+    line = longitude_family((90.0, 0.0), 1, LINE_SAMPLES)[0]
+    x, y, z = line[:, 0], line[:, 1], line[:, 2]
+    results.append(summarize(
+        'rotate_sphere_fast', {'points': LINE_SAMPLES},
+        time_call(lambda: rotate_sphere_fast(x, y, z, R), repeat, number=1000),
+    ))
+
+    for divisions in division_counts:
+        def generate(divisions=divisions):
+            longitude_family.cache_clear()
+            longitude_family((45.0, 30.0), divisions, LINE_SAMPLES)
+        results.append(summarize(
+            'longitude_family', {'divisions': divisions, 'cached': False},
+            time_call(generate, repeat, number=10),
+        ))
+
+    for n_sets in set_counts:
+        for divisions in division_counts:
+            store = GeometryStore()
+            for key, direction in enumerate(scene_directions(n_sets)):
+                store.add(key, longitude_family(direction, divisions, LINE_SAMPLES))
+            params = {'sets': n_sets, 'divisions': divisions, 'points': len(store)}
+            results.append(summarize(
+                'GeometryStore.rotate', params,
+                time_call(lambda: store.rotate(R), repeat, number=10),
+            ))
+            check_partial_rotate(store, R)
+            edited = longitude_family(scene_directions(n_sets)[0], divisions, LINE_SAMPLES)
+
+            def edit_one_set():
+                store.add(0, edited)
+                store.rotate(R, [0])
+            results.append(summarize(
+                'GeometryStore.rotate (one set edited)', params,
+                time_call(edit_one_set, repeat, number=10),
+            ))
+            rotated = store.rotate(R)
+            xr, yr, zr = rotated[:, 0], rotated[:, 1], rotated[:, 2]
+            work = ProjectionWorkspace()
+            out = np.empty((len(rotated), 2), dtype=rotated.dtype)
+            for name in PROJECTIONS:
+                results.append(summarize(
+                    'get_projection', dict(params, projection=name),
+                    time_call(lambda: get_projection(xr, yr, zr, r, name), repeat, number=10),
+                ))
+                results.append(summarize(
+                    'project_points', dict(params, projection=name),
+                    time_call(lambda: project_points(rotated, r, name, out=out, work=work), repeat, number=10),
+                ))
+    return results
+
+
+def bench_gui(repeat, set_counts, division_counts):
+    """Benchmark line generation and full frames of the main window."""
+    from PyQt5 import QtWidgets
+    from visualizer import SphereProjectionVisualizer
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    window = SphereProjectionVisualizer()
+    window.show()
+    app.processEvents()
+
+    results = []
+    for divisions in division_counts:
+        def generate(divisions=divisions):
+            longitude_family.cache_clear()
+            window.generate_longitude_lines((45.0, 30.0), divisions)
+        results.append(summarize(
+            'generate_longitude_lines', {'divisions': divisions},
+            time_call(generate, repeat),
+        ))
+
+    for n_sets in set_counts:
+        for divisions in division_counts:
+            window.clear_line_sets()
+            for direction in scene_directions(n_sets):
+                window.add_line_set('bench', direction, divisions, (0.2, 0.4, 0.8, 1))
+            params = {'sets': n_sets, 'divisions': divisions, 'points': len(window.geometry)}
+            for index in range(window.projection_combo.count()):
+                window.projection_combo.setCurrentIndex(index)
+                name = window.projection_combo.currentData()
+                slider = window.tilt_slider['slider']
+
+                def frame():
+                    # Render the scheduled stages now and wait for the
+                    # projection worker's result to be shown
+                    slider.setValue((slider.value() + 1) % slider.maximum())
+                    window.scheduler.render()
+                    while window.displayed_generation != window.projection_generation:
+                        app.processEvents()
+
+                def frame_painted():
+                    frame()
+                    window.plot_widget.viewport().repaint()
+
+                results.append(summarize(
+                    'frame', dict(params, projection=name), time_call(frame, repeat),
+                ))
+                results.append(summarize(
+                    'frame_painted', dict(params, projection=name), time_call(frame_painted, repeat),
+                ))
+    window.close()
+    return results
+
+
+def metadata():
+    """Describe the environment the benchmarks ran in."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, cwd=SRC_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def print_results(results, baseline=None):
+    """Print a readable table, with the ratio to a baseline run if given."""
+    previous = {result_key(res): res for res in baseline or []}
+    for res in results:
+        params = ', '.join(f'{k}={v}' for k, v in res['params'].items())
+        line = f"{res['name']:<26} {params:<60} {res['median_s'] * 1e3:10.4f} ms"
+        old = previous.get(result_key(res))
+        if old is not None:
+            line += f"  x{old['median_s'] / res['median_s']:.2f} vs baseline"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--repeat', type=int, default=7, help='timing rounds per benchmark')
+    parser.add_argument('--quick', action='store_true', help='use fewer scene sizes')
+    parser.add_argument('--no-gui', action='store_true', help='skip the Qt benchmarks')
+    args = parser.parse_args(argv)
+
+    set_counts = QUICK_SET_COUNTS if args.quick else SET_COUNTS
+    division_counts = QUICK_DIVISION_COUNTS if args.quick else DIVISION_COUNTS
+
+    results = bench_math(args.repeat, set_counts, division_counts)
+    if not args.no_gui:
+        results += bench_gui(args.repeat, set_counts, division_counts)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Render a rotation sweep of a saved project to numbered PNG frames.
+
+    python src/batch.py scene.vacpa frames/ --frames 120
+    python src/batch.py scene.vacpa frames/ --keyframe 0 0 0 --keyframe 30 0 180 --frames 240
+"""
+import argparse
+import os
+import re
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.constants import r, LINE_SAMPLES
+from core.geometry import longitude_family
+from core.project_io import load_project
+from core.projection import get_projection_object, get_rotation_matrices, project_points
+from core.scene import ROTATION_KEYS, Scene, SceneSet, default_view_rect, join_lines
+from raster_export import export_png
+
+
+def read_keyframes(path):
+    """Read ``tilt roll pan`` rows in degrees, separated by commas or spaces."""
+    keyframes = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                keyframes.append([float(v) for v in re.split(r'[,\s]+', line)])
+    keyframes = np.asarray(keyframes, dtype=np.float64)
+    if keyframes.ndim != 2 or keyframes.shape[1] != 3:
+        raise ValueError(f'{path}: expected three angles per line')
+    return keyframes
+
+
+def camera_path(keyframes, frames=None):
+    """Angles ``(n, 3)`` in degrees of every frame.
+
+    Without ``frames`` every keyframe is one frame; otherwise ``frames``
+    frames are spaced evenly along the straight segments between the
+    keyframes, first and last keyframe included.
+    """
+    keyframes = np.asarray(keyframes, dtype=np.float64).reshape(-1, 3)
+    if frames is None or len(keyframes) == 1:
+        return np.repeat(keyframes, 1 if frames is None else frames, axis=0)
+    t = np.linspace(0, len(keyframes) - 1, frames)
+    return np.stack([np.interp(t, np.arange(len(keyframes)), keyframes[:, i]) for i in range(3)], axis=1)
+
+
+def turntable(project, frames):
+    """A full pan turn starting from the project's saved rotation."""
+    rotation = project.get('rotation', {})
+    start = [rotation.get(key, 0.0) for key in ROTATION_KEYS]
+    end = start[:2] + [start[2] + 360.0]
+    # The last frame would repeat the first
+    return camera_path([start, end], frames + 1)[:-1]
+
+
+def base_geometry(line_sets, samples):
+    """Unrotated points of the visible sets, packed into one ``(n, 3)`` array.
+
+    Returns the points and ``(name, color, start, divisions)`` per set.
+    """
+    parts, layout, start = [], [], 0
+    for set_data in line_sets:
+        if not set_data['visible']:
+            continue
+        family = longitude_family(tuple(set_data['direction']), set_data['divisions'], samples)
+        parts.append(family.reshape(-1, 3))
+        layout.append((set_data['name'], tuple(set_data['color']), start, set_data['divisions']))
+        start += len(parts[-1])
+    points = np.concatenate(parts) if parts else np.empty((0, 3))
+    return points, layout
+
+
+# State of a frame worker, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, shape, layout, samples, projection, settings):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    points = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    points.setflags(write=False)
+    _worker.update(shm=shm, points=points, layout=layout, samples=samples,
+                   projection=projection, settings=settings,
+                   outline=get_projection_object(projection).outline(r))
+
+
+def _render_frame(path, angles):
+    """Project the shared base geometry at ``angles`` and write one frame."""
+    points, samples, projection = _worker['points'], _worker['samples'], _worker['projection']
+    R = get_rotation_matrices(*np.radians(angles))
+    wrap_width = get_projection_object(projection).wrap_width
+    sets = []
+    for name, color, start, divisions in _worker['layout']:
+        stop = start + divisions * samples
+        projected = project_points(points[start:stop] @ R.T, r, projection)
+        offsets = np.arange(divisions + 1) * samples
+        x, y = join_lines(projected[:, 0], projected[:, 1], offsets, wrap_width)
+        sets.append(SceneSet(name, color, x, y))
+    export_png(Scene(projection, _worker['outline'], sets), path, **_worker['settings'])
+    return path
+
+
+def render_frames(project, out_dir, angles, width, view_rect=None, line_width=None,
+                  samples=None, workers=None, pattern='frame_{:04d}.png', progress=None):
+    """Render one PNG per row of ``angles`` (degrees) into ``out_dir``.
+
+    Frames are spread over a process pool of ``workers`` processes (one per
+    core by default).  The unrotated line geometry is built once, sampled
+    with ``samples`` points per line (scaled with ``width`` by default), and
+    shared read-only with the workers.  ``progress(done, total)`` is called
+    as frames finish.  Returns the frame paths in order.
+    """
+    if samples is None:
+        samples = max(LINE_SAMPLES, width // 4)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, pattern.format(i)) for i in range(len(angles))]
+    settings = dict(width=width, view_rect=view_rect or default_view_rect(), line_width=line_width)
+
+    points, layout = base_geometry(project['line_sets'], samples)
+    shm = shared_memory.SharedMemory(create=True, size=max(points.nbytes, 1))
+    try:
+        np.ndarray(points.shape, dtype=np.float64, buffer=shm.buf)[:] = points
+        # Spawned workers do not inherit Qt or numpy thread state from this process
+        context = multiprocessing.get_context('spawn')
+        initargs = (shm.name, points.shape, layout, samples,
+                    project.get('projection') or 'Orthographic', settings)
+        with ProcessPoolExecutor(min(workers, len(paths)) or 1, mp_context=context,
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_render_frame, path, tuple(a)) for path, a in zip(paths, angles)]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress is not None:
+                    progress(done, len(paths))
+    finally:
+        shm.close()
+        shm.unlink()
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('project', help='.vacpa project file')
+    parser.add_argument('output', help='directory for the frames')
+    parser.add_argument('--keyframe', type=float, nargs=3, action='append',
+                        metavar=('TILT', 'ROLL', 'PAN'), help='camera keyframe in degrees (repeatable)')
+    parser.add_argument('--path', help='file of keyframes, one "tilt roll pan" per line')
+    parser.add_argument('--frames', type=int, help='frames spread along the keyframes '
+                        '(default: one per keyframe, or 120 for a turntable without keyframes)')
+    parser.add_argument('--width', type=int, default=1080, help='frame width in pixels')
+    parser.add_argument('--line-width', type=float, help='line width in pixels')
+    parser.add_argument('--view', type=float, nargs=4, metavar=('X0', 'Y0', 'X1', 'Y1'),
+                        help='plot area to render (default: the plot bounds)')
+    parser.add_argument('--samples', type=int, help='points per line (default: width / 4)')
+    parser.add_argument('--workers', type=int, help='processes (default: one per core)')
+    args = parser.parse_args(argv)
+
+    project = load_project(args.project)
+    keyframes = list(args.keyframe or [])
+    if args.path:
+        keyframes.extend(read_keyframes(args.path))
+    if keyframes:
+        angles = camera_path(keyframes, args.frames)
+    else:
+        angles = turntable(project, args.frames or 120)
+    digits = max(4, len(str(len(angles) - 1)))
+
+    def progress(done, total):
+        print(f'\r{done}/{total} frames', end='', file=sys.stderr, flush=True)
+
+    render_frames(project, args.output, angles, args.width, args.view, args.line_width,
+                  args.samples, args.workers, f'frame_{{:0{digits}d}}.png', progress)
+    print(f'\nwrote {len(angles)} frames to {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
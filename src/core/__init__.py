@@ -0,0 +1,37 @@
+"""Qt-free core of VaCPA: line geometry, rotation, projection and the scene model.
+
+Only NumPy is needed, so the package can be used from scripts and servers
+without loading the GUI stack::
+
+    import core
+
+    sets = core.default_line_sets()
+    scene = core.build_scene(sets, core.rotation_matrix({'pan': 30}), 'Stereographic')
+    core.export_svg(scene, 'guides.svg')
+
+The GUI modules are adapters over these functions.
+"""
+from .constants import r, LINE_SAMPLES, PLOT_BOUNDS
+from .geometry import GeometryStore, adaptive_longitude_family, longitude_family
+from .project_io import FILE_EXTENSION, ProjectFormatError, load_project, save_project
+from .projection import (
+    PROJECTIONS,
+    get_inverse_projection,
+    get_projection,
+    get_projection_object,
+    get_rotation_matrices,
+    project_points,
+    register_projection,
+    rotate_project,
+)
+from .scene import (
+    Scene,
+    SceneSet,
+    build_scene,
+    default_line_sets,
+    default_view_rect,
+    line_set,
+    project_scene,
+    rotation_matrix,
+)
+from .vector_export import export_pdf, export_svg
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def clip_polylines(x, y, rect):
+    """Clip NaN-separated polylines to a rectangle.
+
+    ``rect`` is ``(x_min, y_min, x_max, y_max)``.  Every segment is clipped
+    with the Liang-Barsky algorithm, all at once: segments entirely outside
+    are dropped and segments crossing the border end on exact boundary
+    points.  Returns new ``x``, ``y`` arrays in which each visible run is
+    separated by NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) < 2:
+        return np.empty(0), np.empty(0)
+    x_min, y_min, x_max, y_max = rect
+
+    px, py = x[:-1], y[:-1]
+    dx, dy = x[1:] - px, y[1:] - py
+    valid = np.isfinite(px) & np.isfinite(py) & np.isfinite(dx) & np.isfinite(dy)
+
+    # Liang-Barsky: the segment is inside edge k where p_k * t <= q_k
+    p = np.stack([-dx, dx, -dy, dy])
+    q = np.stack([px - x_min, x_max - px, py - y_min, y_max - py])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = q / p
+    t0 = np.max(np.where(p < 0, ratio, 0.0), axis=0)
+    t1 = np.min(np.where(p > 0, ratio, 1.0), axis=0)
+    parallel_outside = ((p == 0) & (q < 0)).any(axis=0)
+    accepted = valid & ~parallel_outside & (t0 <= t1)
+
+    # A segment continues the previous one when both reach their shared vertex
+    continues = np.zeros_like(accepted)
+    continues[1:] = accepted[:-1] & accepted[1:] & (t1[:-1] >= 1) & (t0[1:] <= 0)
+    continued = np.zeros_like(accepted)
+    continued[:-1] = continues[1:]
+
+    index = np.flatnonzero(accepted)
+    new_run = ~continues[index]
+    run_end = ~continued[index]
+    counts = 1 + new_run + run_end
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    total = int(ends[-1]) if len(ends) else 0
+
+    out_x = np.full(total, np.nan)
+    out_y = np.full(total, np.nan)
+    seg_t0, seg_t1 = t0[index], t1[index]
+    first = starts[new_run]
+    out_x[first] = px[index][new_run] + seg_t0[new_run] * dx[index][new_run]
+    out_y[first] = py[index][new_run] + seg_t0[new_run] * dy[index][new_run]
+    last = starts + new_run
+    out_x[last] = px[index] + seg_t1 * dx[index]
+    out_y[last] = py[index] + seg_t1 * dy[index]
+    return out_x, out_y
@@ -1,8 +1,10 @@
 r = 2
 N = 50  # Reduced resolution for better performance
 DIVISIONS = 6
+LINE_SAMPLES = 100  # Points sampled along each longitude line
 # Plot bounds represented as (x, y, width, height)
 # Define the projection area symmetrically around the origin so that
 # both the rectangle and its anchor can move freely in all directions.
 PLOT_BOUNDS = (-2, -2, 4, 4)
 LINE_WIDTH = 2  # Default line width for rendered lines
+ADAPTIVE_TOLERANCE_PX = 0.5  # Max projected chord error for adaptive sampling
@@ -0,0 +1,267 @@
+import functools
+
+import numpy as np
+
+from .constants import r
+
+
+class GeometryStore:
+    """Contiguous vertex buffer holding the base coordinates of every line.
+
+    Lines are registered in blocks (one block per line set).  All blocks are
+    packed into a single ``(total_points, 3)`` array so that rotating the
+    whole scene is a single matrix product; rotated coordinates are handed
+    out as views into one shared buffer.
+    """
+
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self._blocks = {}
+        self._offsets = {}
+        self._line_offsets = {}
+        self._versions = {}
+        # Blocks added since the last rotation of their rows
+        self._stale = set()
+        self._coords = np.empty((0, 3), dtype=self.dtype)
+        self._rotated = np.empty((0, 3), dtype=self.dtype)
+        self._dirty = False
+        self.version = 0
+
+    def __contains__(self, key):
+        return key in self._blocks
+
+    def __len__(self):
+        self._pack()
+        return len(self._coords)
+
+    @property
+    def coords(self):
+        """Packed base coordinates of every registered line."""
+        self._pack()
+        return self._coords
+
+    @property
+    def rotated(self):
+        """Packed coordinates as of the last call to :meth:`rotate`."""
+        self._pack()
+        return self._rotated
+
+    def add(self, key, lines):
+        """Register (or replace) the lines of block ``key``.
+
+        ``lines`` is a sequence of ``(n_i, 3)`` arrays or a single
+        ``(n_lines, n_points, 3)`` array.
+        """
+        lines = [np.asarray(line, dtype=self.dtype).reshape(-1, 3) for line in lines]
+        lengths = np.array([len(line) for line in lines], dtype=np.intp)
+        bounds = np.zeros(len(lines) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=bounds[1:])
+        block = np.concatenate(lines) if lines else np.empty((0, 3), dtype=self.dtype)
+        block.setflags(write=False)
+        self._blocks[key] = block
+        self._line_offsets[key] = bounds
+        self._stale.add(key)
+        self._dirty = True
+        self.version += 1
+        self._versions[key] = self.version
+
+    def remove(self, key):
+        """Forget the lines of block ``key``."""
+        if self._blocks.pop(key, None) is not None:
+            del self._line_offsets[key]
+            del self._versions[key]
+            self._stale.discard(key)
+            self._dirty = True
+            self.version += 1
+
+    def clear(self):
+        """Remove every block."""
+        self._blocks.clear()
+        self._line_offsets.clear()
+        self._versions.clear()
+        self._stale.clear()
+        self._dirty = True
+        self.version += 1
+
+    def _pack(self):
+        """Rebuild the contiguous buffers after blocks were added or removed.
+
+        Blocks that did not change keep their rotated rows; the rows of new
+        blocks hold their base coordinates until they are rotated.
+        """
+        if not self._dirty:
+            return
+        old_offsets, old_rotated = self._offsets, self._rotated
+        start = 0
+        self._offsets = {}
+        for key, block in self._blocks.items():
+            self._offsets[key] = (start, start + len(block))
+            start += len(block)
+        if self._blocks:
+            self._coords = np.concatenate(list(self._blocks.values()))
+        else:
+            self._coords = np.empty((0, 3), dtype=self.dtype)
+        self._coords.setflags(write=False)
+        self._rotated = self._coords.copy()
+        for key, (start, stop) in self._offsets.items():
+            if key not in self._stale:
+                old_start, old_stop = old_offsets[key]
+                self._rotated[start:stop] = old_rotated[old_start:old_stop]
+        self._dirty = False
+
+    def rotate(self, R, keys=None):
+        """Rotate the registered points by ``R`` and return the packed result.
+
+        With ``keys`` only those blocks, and blocks added since the last
+        rotation, are rotated; the others keep their last rotation.
+        """
+        self._pack()
+        R = np.asarray(R, dtype=self.dtype)
+        if keys is None:
+            np.matmul(self._coords, R.T, out=self._rotated)
+        else:
+            for key in self._stale.union(keys):
+                start, stop = self._offsets[key]
+                np.matmul(self._coords[start:stop], R.T, out=self._rotated[start:stop])
+        self._stale.clear()
+        return self._rotated
+
+    def block_range(self, key):
+        """Return the ``(start, stop)`` rows of block ``key`` in the packed buffers."""
+        self._pack()
+        return self._offsets[key]
+
+    def block_version(self, key):
+        """Return the store version at which block ``key`` was last registered."""
+        return self._versions[key]
+
+    def line_offsets(self, key):
+        """Return the line boundaries of block ``key`` relative to its start."""
+        return self._line_offsets[key]
+
+    def base_lines(self, key):
+        """Return per-line views of the store's own copy of block ``key``.
+
+        Unlike :meth:`line_views` they do not change when the store is repacked.
+        """
+        block = self._blocks[key]
+        bounds = self._line_offsets[key]
+        return [block[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def view(self, key, rotated=True):
+        """Return the (rotated) points of block ``key`` as a view."""
+        start, stop = self.block_range(key)
+        source = self._rotated if rotated else self._coords
+        return source[start:stop]
+
+    def line_views(self, key, rotated=True):
+        """Return a list of per-line views into the (rotated) buffer."""
+        block = self.view(key, rotated)
+        bounds = self._line_offsets[key]
+        return [block[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def family_basis(direction, divisions):
+    """Return the pole ``d`` and the per-division unit vectors ``v`` of a family.
+
+    Line ``k`` of the family is the half great circle
+    ``r * (cos(t) * d + sin(t) * v[k])`` for ``t`` in ``[0, pi]``.
+    """
+    theta, phi = np.radians(direction)
+    d = np.array([
+        np.sin(theta) * np.cos(phi),
+        np.sin(theta) * np.sin(phi),
+        np.cos(theta),
+    ])
+    if np.allclose(d, [0, 0, 1]):
+        e1 = np.array([1.0, 0.0, 0.0])
+    else:
+        e1 = np.cross(d, [0, 0, 1])
+        e1 = e1 / np.linalg.norm(e1)
+    e2 = np.cross(d, e1)
+    angles = 2 * np.pi * np.arange(divisions) / divisions
+    v = np.cos(angles)[:, None] * e1 + np.sin(angles)[:, None] * e2
+    return d, v
+
+
+@functools.lru_cache(maxsize=128)
+def longitude_family(direction, divisions, samples):
+    """Return every line of a longitude family as a ``(divisions, samples, 3)`` array.
+
+    ``direction`` is the ``(theta, phi)`` pole of the family in degrees.  The
+    result is cached and read-only; callers must copy it before mutating.
+    """
+    t = np.linspace(0, np.pi, samples)
+    d, v = family_basis(direction, divisions)
+    pts = r * (np.cos(t)[None, :, None] * d + np.sin(t)[None, :, None] * v[:, None, :])
+    pts.setflags(write=False)
+    return pts
+
+
+def adaptive_longitude_family(direction, divisions, R, project, tolerance,
+                              initial=8, max_depth=8, rect=None):
+    """Sample a longitude family adaptively in projected space.
+
+    Every line starts with ``initial`` segments.  Segments whose projected
+    midpoint strays more than ``tolerance`` (in plot units) from the chord
+    are split in two, up to ``max_depth`` times; segments crossing into an
+    invalid (NaN) region are refined to the depth limit so the cut is tight.
+
+    If ``rect`` ``(x_min, y_min, x_max, y_max)`` is given, only segments
+    whose projected points reach into it are refined.
+
+    ``project`` maps rotated ``(x, y, z)`` arrays to ``(x, y)``.  Returns the
+    projected ``x``, ``y`` of every line back to back and the line offsets.
+    """
+    d, v = family_basis(direction, divisions)
+    R = np.asarray(R)
+    d_rot = R @ d
+    v_rot = v @ R.T
+
+    def evaluate(line, t):
+        pts = r * (np.cos(t)[:, None] * d_rot + np.sin(t)[:, None] * v_rot[line])
+        return np.column_stack(project(pts[:, 0], pts[:, 1], pts[:, 2]))
+
+    step = np.pi / initial
+    line = np.repeat(np.arange(divisions), initial)
+    t0 = np.tile(np.arange(initial) * step, divisions)
+    t1 = t0 + step
+    done_line, done_t0 = [], []
+    for depth in range(max_depth + 1):
+        tm = 0.5 * (t0 + t1)
+        p0, pm, p1 = evaluate(line, t0), evaluate(line, tm), evaluate(line, t1)
+        with np.errstate(invalid='ignore'):
+            err = np.hypot(*(pm - 0.5 * (p0 + p1)).T)
+        finite = np.isfinite(np.hstack([p0, pm, p1])).all(axis=1)
+        partial = np.isfinite(np.hstack([p0, pm, p1])).any(axis=1) & ~finite
+        split = (finite & (err > tolerance)) | partial
+        if rect is not None:
+            # fmin/fmax skip NaN, so partially valid segments keep their box;
+            # the chord error pads it for arcs bulging past their samples
+            pad = np.where(finite, err, 0.0)[:, None]
+            lo = np.fmin(np.fmin(p0, pm), p1) - pad
+            hi = np.fmax(np.fmax(p0, pm), p1) + pad
+            split &= ((lo[:, 0] <= rect[2]) & (hi[:, 0] >= rect[0])
+                      & (lo[:, 1] <= rect[3]) & (hi[:, 1] >= rect[1]))
+        if depth == max_depth:
+            split[:] = False
+        done_line.append(line[~split])
+        done_t0.append(t0[~split])
+        line = np.concatenate([line[split], line[split]])
+        t0, t1 = np.concatenate([t0[split], tm[split]]), np.concatenate([tm[split], t1[split]])
+        if not len(line):
+            break
+
+    line = np.concatenate(done_line)
+    t0 = np.concatenate(done_t0)
+    order = np.lexsort((t0, line))
+    line, t0 = line[order], t0[order]
+
+    # Each line gets its segment starts followed by its end point t = pi
+    counts = np.bincount(line, minlength=divisions) + 1
+    offsets = np.zeros(divisions + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    t = np.full(offsets[-1], np.pi)
+    t[np.arange(len(t0)) + line] = t0
+    points = evaluate(np.repeat(np.arange(divisions), counts), t)
+    return points[:, 0], points[:, 1], offsets
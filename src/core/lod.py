@@ -0,0 +1,129 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from .constants import PLOT_BOUNDS, ADAPTIVE_TOLERANCE_PX
+from .clipping import clip_polylines
+from .geometry import adaptive_longitude_family
+
+# Zoom levels are powers of two relative to the default plot range: level 1
+# shows half of it, level -1 twice as much.  Level 0 is drawn as is.
+MIN_LEVEL = -4
+MAX_LEVEL = 12
+# Plot width in pixels the refinement tolerance of each level assumes
+REFERENCE_PIXELS = 1000
+
+
+def zoom_level(view_range):
+    """Return the LOD level for a plot view range ``((x0, x1), (y0, y1))``."""
+    (x_min, x_max), (y_min, y_max) = view_range
+    span = min(x_max - x_min, y_max - y_min)
+    if not span > 0:
+        return 0
+    # Truncate towards zero so the default view, slightly larger than
+    # PLOT_BOUNDS because of the locked aspect ratio, stays at level 0
+    level = int(math.log2(PLOT_BOUNDS[2] / span))
+    return min(max(level, MIN_LEVEL), MAX_LEVEL)
+
+
+def tile_size(level):
+    """Side length of the tiles of a (positive) zoom level, in plot units."""
+    return PLOT_BOUNDS[2] / 2 ** level
+
+
+def tile_rect(level, ix, iy):
+    """Return tile ``(ix, iy)`` of ``level`` as ``(x_min, y_min, x_max, y_max)``."""
+    size = tile_size(level)
+    return (ix * size, iy * size, (ix + 1) * size, (iy + 1) * size)
+
+
+def visible_tiles(view_range, level):
+    """Return the ``(ix, iy)`` of every tile of ``level`` overlapping the view."""
+    (x_min, x_max), (y_min, y_max) = view_range
+    size = tile_size(level)
+    xs = range(math.floor(x_min / size), math.floor(x_max / size) + 1)
+    ys = range(math.floor(y_min / size), math.floor(y_max / size) + 1)
+    return tuple((ix, iy) for ix in xs for iy in ys)
+
+
+def level_tolerance(level):
+    """Refinement tolerance of a zoom level, in plot units."""
+    return ADAPTIVE_TOLERANCE_PX * PLOT_BOUNDS[2] / (REFERENCE_PIXELS * 2 ** level)
+
+
+def decimate(x, y, line_offsets, stride):
+    """Keep every ``stride``-th vertex of each line, plus its end point."""
+    if stride <= 1:
+        return x, y, line_offsets
+    starts, stops = line_offsets[:-1], line_offsets[1:]
+    lengths = stops - starts
+    # Vertices kept per line: 0, stride, 2 * stride, ... and the last one
+    counts = (lengths - 2) // stride + 2
+    counts[lengths < 2] = lengths[lengths < 2]
+    offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    local = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts)
+    index = np.repeat(starts, counts) + np.minimum(local * stride, np.repeat(lengths - 1, counts))
+    return x[index], y[index], offsets
+
+
+def refine_tile(layout, R, project, level, ix, iy):
+    """Sample one line set densely inside one tile.
+
+    ``layout`` is a :class:`worker.SetLayout`.  Returns NaN-separated ``x``,
+    ``y`` clipped to the tile, so neighbouring tiles meet exactly on their
+    shared border.
+    """
+    rect = tile_rect(level, ix, iy)
+    x, y, offsets = adaptive_longitude_family(
+        layout.direction, layout.divisions, R, project, level_tolerance(level),
+        max_depth=8 + level, rect=rect,
+    )
+    breaks = offsets[1:-1]
+    x = np.insert(x, breaks, np.nan)
+    y = np.insert(y, breaks, np.nan)
+    return clip_polylines(x, y, rect)
+
+
+def join_pieces(pieces):
+    """Concatenate NaN-separated ``(x, y)`` pieces into one polyline set."""
+    pieces = [piece for piece in pieces if len(piece[0])]
+    if not pieces:
+        return np.empty(0), np.empty(0)
+    gap = np.full(1, np.nan)
+    x = np.concatenate([part for px, _ in pieces for part in (px, gap)][:-1])
+    y = np.concatenate([part for _, py in pieces for part in (py, gap)][:-1])
+    return x, y
+
+
+class TileCache:
+    """LRU cache of refined tile geometry, bounded by its number of points."""
+
+    def __init__(self, max_points=4_000_000):
+        self.max_points = max_points
+        self._tiles = OrderedDict()
+        self._points = 0
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        old = self._tiles.pop(key, None)
+        if old is not None:
+            self._points -= len(old[0])
+        self._tiles[key] = tile
+        self._points += len(tile[0])
+        while self._points > self.max_points and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._points -= len(evicted[0])
+
+    def clear(self):
+        self._tiles.clear()
+        self._points = 0
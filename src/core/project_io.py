@@ -0,0 +1,144 @@
+"""Reading and writing VaCPA project files.
+
+A project file is a small fixed header, a JSON description of the scene and
+optionally the base geometry of every line set as one float32 section::
+
+    magic     8 bytes   b'VACPA\\r\\n\\x1a'
+    version   uint16    FORMAT_VERSION
+    length    uint32    byte length of the JSON header
+    header    JSON      line sets, rotation, projection
+    padding             up to a multiple of GEOMETRY_ALIGN
+    geometry  float32   (points, 3), little-endian, C order
+
+The geometry section can be memory-mapped, so opening a large scene does not
+regenerate its lines.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'VACPA\r\n\x1a'
+FORMAT_VERSION = 1
+FILE_EXTENSION = '.vacpa'
+GEOMETRY_ALIGN = 64
+GEOMETRY_DTYPE = np.dtype('<f4')
+
+_PREFIX = struct.Struct('<8sHI')
+_SET_KEYS = frozenset({'name', 'direction', 'divisions', 'color', 'visible'})
+
+
+class ProjectFormatError(ValueError):
+    """Raised when a file is not a readable VaCPA project."""
+
+
+def _aligned(offset):
+    return -(-offset // GEOMETRY_ALIGN) * GEOMETRY_ALIGN
+
+
+def save_project(path, line_sets, rotation, projection, geometry=None):
+    """Write a project file.
+
+    ``line_sets`` are the window's set dicts, ``rotation`` maps ``tilt``,
+    ``roll`` and ``pan`` to degrees and ``projection`` is a projection name.
+    If ``geometry`` (a :class:`.geometry.GeometryStore`) is given, the base
+    coordinates of every set are embedded.  The file is written next to
+    ``path`` and moved into place, so a failed write leaves the previous
+    version intact.  On Windows the move fails while the previous version
+    is still memory-mapped; drop or copy the arrays returned by
+    :func:`load_project` before saving over the file.
+    """
+    sets = []
+    blocks = []
+    offset = 0
+    for set_data in line_sets:
+        entry = {
+            'name': set_data['name'],
+            'direction': [float(v) for v in set_data['direction']],
+            'divisions': int(set_data['divisions']),
+            'color': [float(c) for c in set_data['color']],
+            'visible': bool(set_data['visible']),
+        }
+        if geometry is not None:
+            block = geometry.view(set_data['id'], rotated=False)
+            line_offsets = geometry.line_offsets(set_data['id'])
+            entry['geometry'] = {
+                'offset': offset,
+                'line_offsets': [int(v) for v in line_offsets],
+            }
+            blocks.append(block)
+            offset += len(block)
+        sets.append(entry)
+
+    header = {
+        'line_sets': sets,
+        'rotation': {key: float(value) for key, value in rotation.items()},
+        'projection': projection,
+    }
+    if geometry is not None:
+        header['geometry'] = {'dtype': GEOMETRY_DTYPE.str, 'points': offset}
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        if geometry is not None:
+            f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
+            for block in blocks:
+                f.write(np.ascontiguousarray(block, dtype=GEOMETRY_DTYPE).tobytes())
+    os.replace(temp_path, path)
+
+
+def load_project(path, mmap=True):
+    """Read a project file.
+
+    Returns the header dict.  Sets saved with geometry get a ``lines`` entry:
+    one ``(samples, 3)`` float32 array per line, backed by a read-only memory
+    map of the file unless ``mmap`` is False.  The map stays open while any
+    of these arrays is referenced.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ProjectFormatError('file is too short')
+        magic, version, length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ProjectFormatError('not a VaCPA project file')
+        if version > FORMAT_VERSION:
+            raise ProjectFormatError(f'unsupported project version {version}')
+        try:
+            header = json.loads(f.read(length).decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ProjectFormatError(f'corrupt project header: {exc}') from None
+    for entry in header.get('line_sets', ()):
+        missing = _SET_KEYS.difference(entry)
+        if missing:
+            raise ProjectFormatError(f"line set is missing {', '.join(sorted(missing))}")
+
+    info = header.get('geometry')
+    if info is None or not info['points']:
+        return header
+    start = _aligned(_PREFIX.size + length)
+    shape = (info['points'], 3)
+    dtype = np.dtype(info['dtype'])
+    try:
+        if mmap:
+            coords = np.memmap(path, dtype=dtype, mode='r', offset=start, shape=shape)
+        else:
+            coords = np.fromfile(path, dtype=dtype, count=3 * shape[0], offset=start).reshape(shape)
+    except ValueError as exc:
+        raise ProjectFormatError(f'truncated geometry section: {exc}') from None
+    if len(coords) != shape[0]:
+        raise ProjectFormatError('truncated geometry section')
+    # Plain ndarray views of the map slice much faster than memmap objects
+    coords = coords.view(np.ndarray)
+
+    for entry in header['line_sets']:
+        block_info = entry.pop('geometry', None)
+        if block_info is None:
+            continue
+        line_offsets = np.asarray(block_info['line_offsets']) + block_info['offset']
+        entry['lines'] = [coords[a:b] for a, b in zip(line_offsets[:-1], line_offsets[1:])]
+    return header
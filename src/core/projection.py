@@ -0,0 +1,403 @@
+import numpy as np
+from .constants import r
+
+
+def generate_great_circle(normal, num_points=100):
+    """Generate points along a great circle with given normal."""
+    normal = normal / np.linalg.norm(normal)
+    if np.allclose(normal, [0, 0, 1]):
+        v1 = np.array([1, 0, 0])
+    else:
+        v1 = np.cross(normal, [0, 0, 1])
+        v1 = v1 / np.linalg.norm(v1)
+    v2 = np.cross(normal, v1)
+    t = np.linspace(0, 2 * np.pi, num_points)
+    circle = np.outer(np.cos(t), v1) + np.outer(np.sin(t), v2)
+    return circle[:, 0] * r, circle[:, 1] * r, circle[:, 2] * r
+
+
+def get_rotation_matrices(tilt, roll, pan):
+    """Compute rotation matrices from Euler angles."""
+    cos_t, sin_t = np.cos(tilt), np.sin(tilt)
+    cos_r, sin_r = np.cos(roll), np.sin(roll)
+    cos_p, sin_p = np.cos(pan), np.sin(pan)
+
+    Rx = np.array([
+        [1, 0, 0],
+        [0, cos_t, -sin_t],
+        [0, sin_t, cos_t]
+    ])
+    Ry = np.array([
+        [cos_r, 0, sin_r],
+        [0, 1, 0],
+        [-sin_r, 0, cos_r]
+    ])
+    Rz = np.array([
+        [cos_p, -sin_p, 0],
+        [sin_p, cos_p, 0],
+        [0, 0, 1]
+    ])
+    return Rz @ Ry @ Rx
+
+
+def get_inverse_rotation_matrices(tilt, roll, pan):
+    """Compute the rotation undoing :func:`get_rotation_matrices`."""
+    return get_rotation_matrices(tilt, roll, pan).T
+
+
+def rotate_sphere_fast(x, y, z, R):
+    """Apply rotation matrix to coordinates."""
+    coords = np.vstack((x.flatten(), y.flatten(), z.flatten()))
+    rotated = R @ coords
+    return rotated[0].reshape(x.shape), rotated[1].reshape(y.shape), rotated[2].reshape(z.shape)
+
+
+class ProjectionWorkspace:
+    """Scratch buffers reused by the projection kernels between frames.
+
+    Buffers are keyed by name and only reallocated when the requested shape
+    or dtype changes, so repeated frames of the same scene allocate nothing.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.float64):
+        """Return the buffer ``name`` with the given shape and dtype."""
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+
+class Projection:
+    """A mapping of rotated sphere points onto the plot plane.
+
+    Subclasses implement :meth:`map` with closed-form vector formulas that
+    write into caller-owned buffers, and :meth:`mask` to flag points outside
+    their valid domain, which :meth:`project` then sets to NaN.
+    """
+
+    name = ''
+    label_key = ''
+    # Horizontal period of projections that wrap around (e.g. 360° panoramas)
+    wrap_width = None
+
+    def map(self, xyz, r, out, work):
+        """Write the projected coordinates of ``xyz`` into ``out``."""
+        raise NotImplementedError
+
+    def mask(self, xyz, r, invalid, work):
+        """Mark invalid points in ``invalid``; return False if there are none."""
+        return False
+
+    def project(self, xyz, r, out, work):
+        """Project ``xyz`` into ``out`` and blank points outside the domain."""
+        self.map(xyz, r, out, work)
+        invalid = work.get('invalid', (len(xyz),), bool)
+        if self.mask(xyz, r, invalid, work):
+            np.copyto(out, np.nan, where=invalid[:, None])
+        return out
+
+    def inverse(self, xy, r):
+        """Map ``(n, 2)`` plot points back onto the rotated sphere.
+
+        Returns ``(n, 3)`` points of radius ``r`` and a mask of the points
+        that lie inside the projection's image.
+        """
+        raise NotImplementedError
+
+    def outline(self, r, num_points=100):
+        """Return the ``(x, y)`` border drawn around the projection."""
+        t = np.linspace(0, 2 * np.pi, num_points)
+        return r * np.cos(t), r * np.sin(t)
+
+
+def _from_polar(xy, r, theta, z):
+    """Sphere points at angle ``theta`` from the centre, in the direction of ``xy``."""
+    radius = np.hypot(xy[:, 0], xy[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(radius > 0, r * np.sin(theta) / radius, 0.0)
+    return np.column_stack([xy * scale[:, None], r * z])
+
+
+class StereographicProjection(Projection):
+    """Stereographic projection from +z; the rim is the z = 0 great circle."""
+
+    name = "Stereographic"
+    label_key = 'projection_stereographic'
+
+    def map(self, xyz, r, out, work):
+        factor = work.get('factor', (len(xyz),), out.dtype)
+        np.divide(xyz[:, 2], r, out=factor)
+        np.subtract(1, factor, out=factor)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(1, factor, out=factor)
+            np.multiply(xyz[:, :2], factor[:, None], out=out)
+
+    def mask(self, xyz, r, invalid, work):
+        # Points too close to the projection pole run off to infinity
+        distance = work.get('distance', (len(xyz),), xyz.dtype)
+        np.divide(xyz[:, 2], r, out=distance)
+        np.subtract(1, distance, out=distance)
+        np.less(distance, 0.01, out=invalid)
+        return True
+
+    def inverse(self, xy, r):
+        q = xy / r
+        s = np.einsum('ij,ij->i', q, q)
+        xyz = r * np.column_stack([2 * q / (s + 1)[:, None], (s - 1) / (s + 1)])
+        return xyz, 2 / (s + 1) >= 0.01
+
+
+class AzimuthalProjection(Projection):
+    """Azimuthal equidistant projection about +z, mirrored.
+
+    Written directly in terms of the vector:
+    ``-(4 / pi) * arccos(z / r) * (x, y) / |(x, y)|``.
+    """
+
+    name = "Azimuthal"
+    label_key = 'projection_azimuthal'
+
+    def map(self, xyz, r, out, work):
+        n = len(xyz)
+        factor = work.get('factor', (n,), out.dtype)
+        radius = work.get('radius', (n,), out.dtype)
+        pole = work.get('pole', (n,), bool)
+        np.divide(xyz[:, 2], r, out=factor)
+        np.clip(factor, -1, 1, out=factor)
+        np.arccos(factor, out=factor)
+        np.multiply(factor, -4 / np.pi, out=factor)
+        np.hypot(xyz[:, 0], xyz[:, 1], out=radius)
+        np.equal(radius, 0, out=pole)
+        np.copyto(radius, 1, where=pole)
+        np.divide(factor, radius, out=factor)
+        np.copyto(factor, 0, where=pole)
+        np.multiply(xyz[:, :2], factor[:, None], out=out)
+
+    def mask(self, xyz, r, invalid, work):
+        # The antipode maps to the whole rim, so it has no single position
+        np.hypot(xyz[:, 0], xyz[:, 1], out=work.get('radius', (len(xyz),), xyz.dtype))
+        np.equal(work.get('radius', (len(xyz),), xyz.dtype), 0, out=invalid)
+        below = work.get('below', (len(xyz),), bool)
+        np.less(xyz[:, 2], 0, out=below)
+        np.logical_and(invalid, below, out=invalid)
+        return True
+
+    def inverse(self, xy, r):
+        theta = np.hypot(xy[:, 0], xy[:, 1]) * np.pi / 4
+        return _from_polar(-xy, r, theta, np.cos(theta)), theta <= np.pi
+
+
+class OrthographicProjection(Projection):
+    """Orthographic projection along z; both hemispheres overlap."""
+
+    name = "Orthographic"
+    label_key = 'projection_orthographic'
+
+    def map(self, xyz, r, out, work):
+        np.copyto(out, xyz[:, :2])
+
+    def inverse(self, xy, r):
+        # Both hemispheres overlap; the one facing -z is taken
+        s = np.einsum('ij,ij->i', xy, xy) / r ** 2
+        z = -np.sqrt(np.clip(1 - s, 0, None))
+        return np.column_stack([xy, r * z]), s <= 1
+
+
+class EquisolidProjection(Projection):
+    """Equisolid-angle fisheye centred on -z: ``(x, y) / sqrt(1 - z / r)``.
+
+    The rim (90° from the centre) lands on radius ``r``; only the exact
+    antipode is undefined.
+    """
+
+    name = "Equisolid"
+    label_key = 'projection_equisolid'
+
+    def map(self, xyz, r, out, work):
+        factor = work.get('factor', (len(xyz),), out.dtype)
+        np.divide(xyz[:, 2], r, out=factor)
+        np.subtract(1, factor, out=factor)
+        np.clip(factor, 0, None, out=factor)
+        np.sqrt(factor, out=factor)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(1, factor, out=factor)
+            np.multiply(xyz[:, :2], factor[:, None], out=out)
+
+    def mask(self, xyz, r, invalid, work):
+        distance = work.get('distance', (len(xyz),), xyz.dtype)
+        np.divide(xyz[:, 2], r, out=distance)
+        np.subtract(1, distance, out=distance)
+        np.less(distance, 1e-6, out=invalid)
+        return True
+
+    def inverse(self, xy, r):
+        q = xy / r
+        s = np.einsum('ij,ij->i', q, q)
+        scale = np.sqrt(np.clip(2 - s, 0, None))
+        xyz = r * np.column_stack([q * scale[:, None], s - 1])
+        return xyz, s <= 2 - 1e-6
+
+
+class EquidistantFisheyeProjection(Projection):
+    """Equidistant fisheye centred on -z; radius grows linearly with angle.
+
+    ``(2 / pi) * atan2(|(x, y)|, -z) * (x, y) / |(x, y)|`` scaled so the rim
+    (90° from the centre) lands on radius ``r``.
+    """
+
+    name = "Equidistant"
+    label_key = 'projection_equidistant'
+
+    def map(self, xyz, r, out, work):
+        n = len(xyz)
+        factor = work.get('factor', (n,), out.dtype)
+        radius = work.get('radius', (n,), out.dtype)
+        pole = work.get('pole', (n,), bool)
+        np.hypot(xyz[:, 0], xyz[:, 1], out=radius)
+        np.negative(xyz[:, 2], out=factor)
+        np.arctan2(radius, factor, out=factor)
+        np.equal(radius, 0, out=pole)
+        np.copyto(radius, 1, where=pole)
+        np.divide(factor, radius, out=factor)
+        # At the centre the angle-to-radius ratio tends to 1 / r
+        np.copyto(factor, 1 / r, where=pole)
+        np.multiply(factor, 2 * r / np.pi, out=factor)
+        np.multiply(xyz[:, :2], factor[:, None], out=out)
+
+    def mask(self, xyz, r, invalid, work):
+        radius = work.get('radius', (len(xyz),), xyz.dtype)
+        np.hypot(xyz[:, 0], xyz[:, 1], out=radius)
+        np.equal(radius, 0, out=invalid)
+        below = work.get('below', (len(xyz),), bool)
+        np.greater(xyz[:, 2], 0, out=below)
+        np.logical_and(invalid, below, out=invalid)
+        return True
+
+    def inverse(self, xy, r):
+        theta = np.hypot(xy[:, 0], xy[:, 1]) * np.pi / (2 * r)
+        return _from_polar(xy, r, theta, -np.cos(theta)), theta <= np.pi
+
+
+class EquirectangularProjection(Projection):
+    """Equirectangular (longitude/latitude) map for 360° panoramas.
+
+    Longitude is measured around +y from the -z view direction, latitude
+    towards +y; the full sphere fills ``[-r, r] x [-r / 2, r / 2]``.
+    """
+
+    name = "Equirectangular"
+    label_key = 'projection_equirectangular'
+    wrap_width = 2 * r
+
+    def map(self, xyz, r, out, work):
+        n = len(xyz)
+        radius = work.get('radius', (n,), out.dtype)
+        depth = work.get('factor', (n,), out.dtype)
+        np.negative(xyz[:, 2], out=depth)
+        np.hypot(xyz[:, 0], xyz[:, 2], out=radius)
+        np.arctan2(xyz[:, 0], depth, out=out[:, 0])
+        np.arctan2(xyz[:, 1], radius, out=out[:, 1])
+        np.multiply(out, r / np.pi, out=out)
+
+    def inverse(self, xy, r):
+        lon, lat = xy[:, 0] * np.pi / r, xy[:, 1] * np.pi / r
+        xyz = r * np.column_stack([np.cos(lat) * np.sin(lon), np.sin(lat), -np.cos(lat) * np.cos(lon)])
+        return xyz, (np.abs(lon) <= np.pi) & (np.abs(lat) <= np.pi / 2)
+
+    def outline(self, r, num_points=100):
+        return np.array([-r, r, r, -r, -r]), np.array([-r, -r, r, r, -r]) / 2
+
+
+class MirroredProjection(Projection):
+    """Fallback for unknown projection names: the view mirrored through 0."""
+
+    name = "Mirrored"
+
+    def map(self, xyz, r, out, work):
+        np.negative(xyz[:, :2], out=out)
+
+    def inverse(self, xy, r):
+        return OrthographicProjection.inverse(self, -xy, r)
+
+
+PROJECTIONS = {}
+
+
+def register_projection(projection):
+    """Make ``projection`` available by name to the kernels and the UI."""
+    PROJECTIONS[projection.name] = projection
+    return projection
+
+
+for _projection in (
+    StereographicProjection(),
+    AzimuthalProjection(),
+    OrthographicProjection(),
+    EquisolidProjection(),
+    EquidistantFisheyeProjection(),
+    EquirectangularProjection(),
+):
+    register_projection(_projection)
+
+_FALLBACK_PROJECTION = MirroredProjection()
+
+
+def get_projection_object(projection):
+    """Return the registered projection called ``projection``."""
+    return PROJECTIONS.get(projection, _FALLBACK_PROJECTION)
+
+
+def project_points(xyz, r, projection, out=None, work=None):
+    """Project packed ``(n, 3)`` rotated points into an ``(n, 2)`` array.
+
+    ``projection`` is a registered projection name.  Results are written
+    into ``out`` and temporaries are taken from the
+    :class:`ProjectionWorkspace` ``work``; both are allocated when omitted.
+    Float32 input is processed entirely in float32.  Points outside the
+    projection's valid domain are set to NaN.
+    """
+    dtype = np.dtype(np.float32 if xyz.dtype == np.float32 else np.float64)
+    if out is None:
+        out = np.empty((len(xyz), 2), dtype=dtype)
+    if work is None:
+        work = ProjectionWorkspace()
+    return get_projection_object(projection).project(xyz, dtype.type(r), out, work)
+
+
+def rotate_project(coords, R, r, projection, out=None, work=None):
+    """Rotate packed ``(n, 3)`` base coordinates by ``R`` and project them.
+
+    The rotated points are kept in the workspace buffer ``'rotated'``.
+    """
+    if work is None:
+        work = ProjectionWorkspace()
+    dtype = np.dtype(np.float32 if coords.dtype == np.float32 else np.float64)
+    rotated = work.get('rotated', coords.shape, dtype)
+    np.matmul(coords, np.asarray(R, dtype=dtype).T, out=rotated)
+    return project_points(rotated, r, projection, out=out, work=work)
+
+
+def get_projection(x, y, z, r, projection):
+    """Project 3D coordinates to 2D based on projection type."""
+    x, y, z = np.broadcast_arrays(np.asarray(x), np.asarray(y), np.asarray(z))
+    xyz = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+    out = project_points(xyz, r, projection)
+    return out[:, 0].reshape(x.shape), out[:, 1].reshape(y.shape)
+
+
+def get_inverse_projection(px, py, r, projection):
+    """Map 2D plot coordinates back to rotated 3D coordinates.
+
+    Returns ``x, y, z`` shaped like ``px``; points outside the projection's
+    image are NaN.
+    """
+    px, py = np.broadcast_arrays(np.asarray(px, dtype=np.float64), np.asarray(py, dtype=np.float64))
+    xy = np.stack([px.ravel(), py.ravel()], axis=1)
+    with np.errstate(invalid='ignore'):
+        xyz, valid = get_projection_object(projection).inverse(xy, r)
+    xyz[~valid] = np.nan
+    return tuple(xyz[:, i].reshape(px.shape) for i in range(3))
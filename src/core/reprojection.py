@@ -0,0 +1,221 @@
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import r
+from .projection import get_projection_object, project_points
+
+# Output rows computed per step, bounding the temporaries of large remaps
+CHUNK_ROWS = 256
+
+
+def projection_extent(projection):
+    """Plot rectangle ``(x_min, y_min, x_max, y_max)`` a projection's image fills."""
+    x, y = get_projection_object(projection).outline(r)
+    return float(np.min(x)), float(np.min(y)), float(np.max(x)), float(np.max(y))
+
+
+class RemapTable(NamedTuple):
+    """Precomputed bilinear taps of a remap.
+
+    ``pixels`` are the flat indices of the output pixels that have a
+    source, ``index`` the flat source index of their top-left tap and
+    ``fx``, ``fy`` the blend weights towards the right and lower taps, in
+    1/256 steps so the blend runs in 16-bit integers.
+    """
+
+    shape: tuple
+    src_size: tuple
+    pixels: np.ndarray
+    index: np.ndarray
+    fx: np.ndarray
+    fy: np.ndarray
+
+    @property
+    def nbytes(self):
+        return self.pixels.nbytes + self.index.nbytes + self.fx.nbytes + self.fy.nbytes
+
+
+def source_positions(src_projection, src_size, dst_projection, dst_size, R,
+                     src_R=None, start=0, stop=None):
+    """Source pixel ``(column, row)`` sampled by output rows ``start:stop``.
+
+    The source image shows the sphere in ``src_projection`` (rotated by
+    ``src_R``, identity by default) over that projection's extent; the output
+    shows it in ``dst_projection`` rotated by ``R``, which is how the
+    guidelines are drawn.  Sizes are ``(width, height)``.  Returns an
+    ``(n, 2)`` array, NaN where the output pixel has no source.
+    """
+    dst_width, dst_height = dst_size
+    src_width, src_height = src_size
+    stop = dst_height if stop is None else stop
+    x0, y0, x1, y1 = projection_extent(dst_projection)
+    sx0, sy0, sx1, sy1 = projection_extent(src_projection)
+    # Plot points of the sphere in the destination view rotate back to the
+    # scene by R^T, then forward into the source view
+    M = np.asarray(R, dtype=np.float64).T
+    if src_R is not None:
+        M = np.asarray(src_R, dtype=np.float64) @ M
+
+    columns = x0 + (np.arange(dst_width) + 0.5) * (x1 - x0) / dst_width
+    rows = y1 - (np.arange(start, stop) + 0.5) * (y1 - y0) / dst_height
+    xy = np.empty(((stop - start) * dst_width, 2))
+    xy[:, 0] = np.tile(columns, stop - start)
+    xy[:, 1] = np.repeat(rows, dst_width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xyz, valid = get_projection_object(dst_projection).inverse(xy, r)
+        src_xy = project_points(xyz @ M.T, r, src_projection)
+    src_xy[~valid] = np.nan
+    src_xy[:, 0] = (src_xy[:, 0] - sx0) / (sx1 - sx0) * src_width - 0.5
+    src_xy[:, 1] = (sy1 - src_xy[:, 1]) / (sy1 - sy0) * src_height - 0.5
+    return src_xy
+
+
+def remap_table(src_projection, src_size, dst_projection, dst_size, R,
+                src_R=None, chunk_rows=CHUNK_ROWS):
+    """Compute the :class:`RemapTable` warping ``src_size`` images into ``dst_size``.
+
+    See :func:`source_positions` for the geometry; the output is processed
+    ``chunk_rows`` rows at a time.
+    """
+    dst_width, dst_height = dst_size
+    width, height = src_size
+    parts = []
+    for start in range(0, dst_height, chunk_rows):
+        stop = min(start + chunk_rows, dst_height)
+        positions = source_positions(src_projection, src_size, dst_projection, dst_size,
+                                     R, src_R, start, stop)
+        col, row = positions[:, 0], positions[:, 1]
+        with np.errstate(invalid='ignore'):
+            inside = (col >= -0.5) & (col <= width - 0.5) & (row >= -0.5) & (row <= height - 0.5)
+        pixels = np.flatnonzero(inside)
+        col = np.clip(col[pixels], 0, width - 1)
+        row = np.clip(row[pixels], 0, height - 1)
+        # The top-left tap stays one pixel inside so the other taps exist
+        c0 = np.minimum(col.astype(np.intp), max(width - 2, 0))
+        r0 = np.minimum(row.astype(np.intp), max(height - 2, 0))
+        parts.append((
+            (pixels + start * dst_width).astype(np.int32),
+            (r0 * width + c0).astype(np.int32),
+            np.minimum((col - c0) * 256 + 0.5, 256).astype(np.uint16),
+            np.minimum((row - r0) * 256 + 0.5, 256).astype(np.uint16),
+        ))
+    columns = [np.concatenate(part) for part in zip(*parts)]
+    return RemapTable((dst_height, dst_width), (width, height), *columns)
+
+
+def remap(image, table, chunk_size=CHUNK_ROWS * 2048):
+    """Sample an ``(h, w, 4)`` uint8 RGBA image bilinearly through ``table``.
+
+    Pixels without a source are transparent black.
+    """
+    height, width = image.shape[:2]
+    # Pixels are handled as packed 32-bit words; see _blend
+    packed = np.ascontiguousarray(image).view(np.uint32).reshape(height * width)
+    # Single-pixel images have no right or lower neighbour to blend with
+    step_x = 1 if width > 1 else 0
+    step_y = width if height > 1 else 0
+    out = np.zeros(table.shape + (4,), dtype=np.uint8)
+    out_packed = out.view(np.uint32).reshape(-1)
+    for start in range(0, len(table.pixels), chunk_size):
+        part = slice(start, start + chunk_size)
+        index = table.index[part]
+        fx = table.fx[part].astype(np.uint32)
+        fy = table.fy[part].astype(np.uint32)
+        top = _blend(packed.take(index), packed.take(index + step_x), fx)
+        bottom = _blend(packed.take(index + step_y), packed.take(index + step_y + step_x), fx)
+        out_packed[table.pixels[part]] = _blend(top, bottom, fy)
+    return out
+
+
+def _blend(a, b, weight):
+    """Blend packed RGBA words: ``a + (b - a) * weight / 256`` per byte, rounded.
+
+    The even and odd bytes are blended separately in 16-bit lanes of a
+    32-bit word, which cannot overflow into each other since
+    ``255 * 256 + 128 < 2 ** 16``.
+    """
+    inverse = 256 - weight
+    result = np.empty_like(a)
+    for mask, shift in ((0x00FF00FF, 0), (0xFF00FF00, 8)):
+        lanes = (a >> shift) & 0x00FF00FF
+        lanes *= inverse
+        mixed = (b >> shift) & 0x00FF00FF
+        mixed *= weight
+        lanes += mixed
+        lanes += 0x00800080
+        if shift:
+            lanes &= mask
+            result |= lanes
+        else:
+            lanes >>= 8
+            lanes &= mask
+            result[...] = lanes
+    return result
+
+
+class RemapCache:
+    """LRU cache of remap tables, bounded by their total size in bytes.
+
+    Keys are ``(src_projection, src_size, dst_projection, dst_size,
+    rotation_key)``, where ``rotation_key`` identifies the rotation (e.g. the
+    slider positions), so returning to a slider position reuses its table.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._tables)
+
+    def table(self, src_projection, src_size, dst_projection, dst_size, R, rotation_key=None):
+        """Return the remap table for these parameters, computing it if needed."""
+        if rotation_key is None:
+            rotation_key = np.asarray(R, dtype=np.float64).round(12).tobytes()
+        key = (src_projection, tuple(src_size), dst_projection, tuple(dst_size), rotation_key)
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return table
+        self.misses += 1
+        table = remap_table(src_projection, src_size, dst_projection, dst_size, R)
+        self._tables[key] = table
+        self.nbytes += table.nbytes
+        while self.nbytes > self.max_bytes and len(self._tables) > 1:
+            _, evicted = self._tables.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return table
+
+    def clear(self):
+        self._tables.clear()
+        self.nbytes = 0
+
+
+def output_size(dst_projection, max_side):
+    """Output ``(width, height)`` keeping the aspect of the projection's extent."""
+    x0, y0, x1, y1 = projection_extent(dst_projection)
+    aspect = (x1 - x0) / (y1 - y0)
+    if aspect >= 1:
+        return max_side, max(1, round(max_side / aspect))
+    return max(1, round(max_side * aspect)), max_side
+
+
+def reproject_image(image, src_projection, dst_projection, R, max_side=2048,
+                    cache=None, rotation_key=None):
+    """Warp ``image`` from ``src_projection`` into ``dst_projection`` rotated by ``R``.
+
+    Returns the warped image and the plot rectangle it covers.
+    """
+    size = output_size(dst_projection, max_side)
+    src_size = (image.shape[1], image.shape[0])
+    if cache is None:
+        table = remap_table(src_projection, src_size, dst_projection, size, R)
+    else:
+        table = cache.table(src_projection, src_size, dst_projection, size, R, rotation_key)
+    return remap(image, table), projection_extent(dst_projection)
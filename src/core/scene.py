@@ -0,0 +1,125 @@
+"""Projected guidelines as plain arrays, for exports and headless rendering."""
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import r, LINE_SAMPLES, PLOT_BOUNDS
+from .geometry import adaptive_longitude_family, longitude_family
+from .projection import get_projection, get_projection_object, get_rotation_matrices, project_points
+
+# Name key, direction, divisions and RGBA color of the sets a new scene starts with
+DEFAULT_LINE_SETS = (
+    ('longitudes_x', (90, 0), 16, (1, 0, 0, 1)),
+    ('longitudes_y', (90, 90), 16, (0, 1, 0, 1)),
+    ('longitudes_z', (0, 0), 16, (0, 0, 1, 1)),
+)
+ROTATION_KEYS = ('tilt', 'roll', 'pan')
+
+
+class SceneSet(NamedTuple):
+    """One visible line set: its name, RGBA color and NaN-separated polylines."""
+
+    name: str
+    color: tuple
+    x: np.ndarray
+    y: np.ndarray
+
+
+class Scene(NamedTuple):
+    """Everything drawn on the 2D plot for one rotation and projection."""
+
+    projection: str
+    outline: tuple
+    sets: list
+
+
+def line_set(name, direction, divisions, color, visible=True):
+    """A line set dict as used by :func:`build_scene` and project files."""
+    return {'name': name, 'direction': tuple(direction), 'divisions': int(divisions),
+            'color': tuple(color), 'visible': visible}
+
+
+def default_line_sets():
+    """The line sets of a new scene, named by their translation keys."""
+    return [line_set(*spec) for spec in DEFAULT_LINE_SETS]
+
+
+def rotation_matrix(rotation):
+    """Rotation matrix of a dict of ``tilt``, ``roll`` and ``pan`` in degrees."""
+    return get_rotation_matrices(*(np.radians(rotation.get(key, 0.0)) for key in ROTATION_KEYS))
+
+
+def join_lines(x, y, line_offsets, wrap_width=None):
+    """Join packed lines into one NaN-separated polyline set.
+
+    With ``wrap_width``, lines are also broken where they jump across the
+    seam of a wrapping projection.
+    """
+    breaks = line_offsets[1:-1]
+    x = np.insert(np.asarray(x, dtype=np.float64), breaks, np.nan)
+    y = np.insert(np.asarray(y, dtype=np.float64), breaks, np.nan)
+    if wrap_width:
+        with np.errstate(invalid='ignore'):
+            seam = np.abs(np.diff(x)) > wrap_width / 2
+        x[1:][seam] = np.nan
+        y[1:][seam] = np.nan
+    return x, y
+
+
+def project_set(direction, divisions, R, projection, tolerance=None):
+    """Project one longitude family; returns ``(x, y, line_offsets)``.
+
+    Without ``tolerance`` the lines use the fixed ``LINE_SAMPLES`` samples of
+    the plot; otherwise they are sampled adaptively to that chord error in
+    plot units, which keeps large exports smooth.
+    """
+    if tolerance is not None:
+        def project(x, y, z):
+            return get_projection(x, y, z, r, projection)
+
+        return adaptive_longitude_family(tuple(direction), divisions, R, project, tolerance,
+                                         max_depth=12)
+    family = longitude_family(tuple(direction), divisions, LINE_SAMPLES)
+    points = family.reshape(-1, 3) @ np.asarray(R, dtype=np.float64).T
+    projected = project_points(points, r, projection)
+    offsets = np.arange(divisions + 1) * LINE_SAMPLES
+    return projected[:, 0], projected[:, 1], offsets
+
+
+def build_scene(line_sets, R, projection, tolerance=None):
+    """Project the visible sets of ``line_sets`` for export.
+
+    ``line_sets`` are dicts with ``name``, ``direction``, ``divisions``,
+    ``color`` and ``visible`` keys, as kept by the window or stored in a
+    project file.
+    """
+    projection_object = get_projection_object(projection)
+    wrap_width = projection_object.wrap_width
+    sets = []
+    for set_data in line_sets:
+        if not set_data['visible']:
+            continue
+        x, y, offsets = project_set(set_data['direction'], set_data['divisions'], R,
+                                    projection, tolerance)
+        x, y = join_lines(x, y, offsets, wrap_width)
+        sets.append(SceneSet(set_data['name'], tuple(set_data['color']), x, y))
+    if tolerance is None:
+        outline = projection_object.outline(r)
+    else:
+        # Enough points that the circular outline stays well within the
+        # tolerance; its thick pen shows every corner
+        points = 4 * int(np.ceil(np.pi * np.sqrt(r / (2 * tolerance)))) + 1
+        outline = projection_object.outline(r, max(points, 100))
+    return Scene(projection, outline, sets)
+
+
+def project_scene(project, tolerance=None):
+    """:func:`build_scene` for a project dict, as returned by ``load_project``."""
+    return build_scene(project['line_sets'], rotation_matrix(project.get('rotation', {})),
+                       project.get('projection') or 'Orthographic', tolerance)
+
+
+def default_view_rect(margin=0.05):
+    """``PLOT_BOUNDS`` grown by ``margin`` on every side, as ``(x0, y0, x1, y1)``."""
+    x, y, w, h = PLOT_BOUNDS
+    return (x - margin * w, y - margin * h, x + w * (1 + margin), y + h * (1 + margin))
@@ -0,0 +1,67 @@
+"""Vectorized polyline simplification for exports."""
+import numpy as np
+
+
+def _runs(x, y):
+    """Start and stop indices of the NaN-separated runs of a polyline set."""
+    finite = np.isfinite(x) & np.isfinite(y)
+    edges = np.diff(np.concatenate([[False], finite, [False]]).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    """Distance of points ``p`` to the segments ``a``-``b``."""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / length2, 0, 1)
+    t = np.where(length2 > 0, t, 0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify_polylines(x, y, tolerance):
+    """Simplify NaN-separated polylines with the Douglas-Peucker algorithm.
+
+    All runs are processed together: every iteration finds, for each open
+    interval of every run at once, the vertex farthest from the interval's
+    chord and splits there if it is farther than ``tolerance``, so no
+    dropped vertex lies farther than ``tolerance`` from the result.
+    Returns new NaN-separated ``x``, ``y`` arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    starts, stops = _runs(x, y)
+    keep = np.zeros(len(x), dtype=bool)
+    keep[starts] = True
+    keep[stops - 1] = True
+
+    lo, hi = starts, stops - 1
+    while True:
+        open_ = hi - lo >= 2
+        lo, hi = lo[open_], hi[open_]
+        if not len(lo):
+            break
+        # Interior vertices of every open interval, back to back
+        counts = hi - lo - 1
+        owner = np.repeat(np.arange(len(lo)), counts)
+        first = np.cumsum(counts) - counts
+        index = np.arange(counts.sum()) - np.repeat(first, counts) + np.repeat(lo + 1, counts)
+        distance = _segment_distance(x[index], y[index], x[lo][owner], y[lo][owner],
+                                     x[hi][owner], y[hi][owner])
+        farthest = np.maximum.reduceat(distance, first)
+        # First vertex of each interval reaching its maximum distance
+        hits = np.flatnonzero(distance == farthest[owner])
+        _, first_hit = np.unique(owner[hits], return_index=True)
+        split = index[hits[first_hit]]
+        refine = farthest > tolerance
+        keep[split[refine]] = True
+        lo, hi = (np.concatenate([lo[refine], split[refine]]),
+                  np.concatenate([split[refine], hi[refine]]))
+
+    # Rebuild the arrays with one NaN between runs
+    kept = np.flatnonzero(keep)
+    run_of = np.searchsorted(starts, kept, side='right') - 1
+    breaks = np.flatnonzero(np.diff(run_of)) + 1
+    out_x = np.insert(x[kept], breaks, np.nan)
+    out_y = np.insert(y[kept], breaks, np.nan)
+    return out_x, out_y
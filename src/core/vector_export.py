@@ -0,0 +1,166 @@
+"""Write projected guidelines as SVG or PDF vector paths, one group per line set."""
+import zlib
+
+import numpy as np
+
+from .constants import LINE_WIDTH
+from .clipping import clip_polylines
+from .scene import default_view_rect
+from .simplify import simplify_polylines
+
+# Page width, in SVG user units or PDF points, the default line width suits
+REFERENCE_WIDTH = 1000
+# Simplification tolerance in page units; well below what a print shows
+DEFAULT_TOLERANCE = 0.1
+# Coordinates are written as integers in 1/COORDINATE_SCALE page units
+COORDINATE_SCALE = 100
+
+
+class _Page:
+    """Plot to page transform shared by the writers, y pointing up."""
+
+    def __init__(self, view_rect, width):
+        self.view_rect = view_rect or default_view_rect()
+        x0, y0, x1, y1 = self.view_rect
+        self.width = float(width)
+        self.scale = self.width / (x1 - x0)
+        self.height = (y1 - y0) * self.scale
+
+    def runs(self, x, y, tolerance, margin=0.0):
+        """Clip, simplify and quantize polylines; yields integer ``(n, 2)`` runs in page units."""
+        x0, y0, x1, y1 = self.view_rect
+        pad = margin / self.scale
+        x, y = clip_polylines(x, y, (x0 - pad, y0 - pad, x1 + pad, y1 + pad))
+        if not len(x):
+            return
+        px = (x - x0) * self.scale
+        py = (y - y0) * self.scale
+        px, py = simplify_polylines(px, py, tolerance)
+        finite = np.isfinite(px)
+        points = np.empty((len(px), 2), dtype=np.int64)
+        points[finite, 0] = np.rint(px[finite] * COORDINATE_SCALE)
+        points[finite, 1] = np.rint(py[finite] * COORDINATE_SCALE)
+        edges = np.diff(np.concatenate([[False], finite, [False]]).astype(np.int8))
+        for start, stop in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            if stop - start >= 2:
+                yield points[start:stop]
+
+
+def _hex(color):
+    return '#' + ''.join(f'{int(round(c * 255)):02x}' for c in color[:3])
+
+
+def _layers(scene, line_width):
+    """``(name, color, width, x, y)`` of the outline and the sets, drawn in this order."""
+    yield 'outline', (0, 0, 0), 3 * line_width, scene.outline[0], scene.outline[1]
+    for s in scene.sets:
+        yield s.name, s.color, line_width, s.x, s.y
+
+
+def _escape(text):
+    return (str(text).replace('&', '&amp;').replace('<', '&lt;')
+            .replace('>', '&gt;').replace('"', '&quot;'))
+
+
+def export_svg(scene, path, width=REFERENCE_WIDTH, view_rect=None, line_width=None,
+               tolerance=DEFAULT_TOLERANCE):
+    """Write a :class:`.scene.Scene` as an SVG ``width`` user units wide.
+
+    Every line set is a ``<g>`` titled with its name, holding a single path
+    in the set's color.
+    Polylines are simplified to ``tolerance`` page units.  Returns the page
+    size.
+    """
+    page = _Page(view_rect, width)
+    if line_width is None:
+        line_width = LINE_WIDTH * max(1.0, width / REFERENCE_WIDTH)
+    s = COORDINATE_SCALE
+    height_units = round(page.height * s)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{page.width:g}" '
+                f'height="{page.height:g}" viewBox="0 0 {round(page.width * s)} {height_units}">\n')
+        # Flip to y up so coordinates match the PDF writer
+        f.write(f'<g transform="matrix(1 0 0 -1 0 {height_units})" fill="none" '
+                'stroke-linecap="round" stroke-linejoin="round">\n')
+        for i, (name, color, pen_width, x, y) in enumerate(_layers(scene, line_width)):
+            f.write(f'<g id="layer{i}" stroke="{_hex(color)}" stroke-width="{round(pen_width * s)}">\n'
+                    f'<title>{_escape(name)}</title>\n<path d="')
+            for run in page.runs(x, y, tolerance, pen_width):
+                f.write('M' + ' '.join(map(str, run.ravel().tolist())) + '\n')
+            f.write('"/>\n</g>\n')
+        f.write('</g>\n</svg>\n')
+    return page.width, page.height
+
+
+def _pdf_path(runs):
+    parts = []
+    for run in runs:
+        coords = run.tolist()
+        parts.append('%d %d m\n' % tuple(coords[0]))
+        parts.append(''.join('%d %d l\n' % tuple(point) for point in coords[1:]))
+    return ''.join(parts)
+
+
+def export_pdf(scene, path, width=REFERENCE_WIDTH, view_rect=None, line_width=None,
+               tolerance=DEFAULT_TOLERANCE):
+    """Write a :class:`.scene.Scene` as a one-page PDF ``width`` points wide.
+
+    Every line set is an optional content group, so it shows up as a layer
+    in PDF viewers and editors.  Polylines are simplified to ``tolerance``
+    points.  Returns the page size.
+    """
+    page = _Page(view_rect, width)
+    if line_width is None:
+        line_width = LINE_WIDTH * max(1.0, width / REFERENCE_WIDTH)
+    s = COORDINATE_SCALE
+    layers = list(_layers(scene, line_width))
+
+    content = [f'1 J 1 j {1 / s:g} 0 0 {1 / s:g} 0 0 cm\n']
+    for i, (name, color, pen_width, x, y) in enumerate(layers):
+        r, g, b = color[:3]
+        content.append(f'/OC /L{i} BDC\n{pen_width * s:g} w {r:.4g} {g:.4g} {b:.4g} RG\n')
+        content.append(_pdf_path(page.runs(x, y, tolerance, pen_width)))
+        content.append('S\nEMC\n')
+    stream = zlib.compress(''.join(content).encode('ascii'), 6)
+
+    # Objects: 1 catalog, 2 pages, 3 page, 4 content, 5.. layers
+    layer_refs = ' '.join(f'{5 + i} 0 R' for i in range(len(layers)))
+    properties = ' '.join(f'/L{i} {5 + i} 0 R' for i in range(len(layers)))
+    objects = [
+        f'<< /Type /Catalog /Pages 2 0 R /OCProperties << /OCGs [{layer_refs}] '
+        f'/D << /Order [{layer_refs}] >> >> >>'.encode('ascii'),
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page.width:g} {page.height:g}] '
+        f'/Contents 4 0 R /Resources << /Properties << {properties} >> >> >>'.encode('ascii'),
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+    ]
+    for name, *_ in layers:
+        objects.append(b'<< /Type /OCG /Name ' + _pdf_string(name) + b' >>')
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                % (len(objects) + 1, xref))
+    return page.width, page.height
+
+
+def _pdf_string(text):
+    """PDF text string; non-ASCII names are written as UTF-16 with a byte order mark."""
+    text = str(text)
+    try:
+        data = text.encode('ascii')
+    except UnicodeEncodeError:
+        return b'<' + ('\ufeff' + text).encode('utf-16-be').hex().encode('ascii') + b'>'
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+VECTOR_WRITERS = {'.svg': export_svg, '.pdf': export_pdf}
@@ -0,0 +1,76 @@
+"""Export a saved project without opening a window.
+
+    python src/export.py scene.vacpa poster.png --width 20000
+    python src/export.py scene.vacpa poster.pdf --width 2000
+"""
+import argparse
+import os
+import sys
+
+from core.constants import ADAPTIVE_TOLERANCE_PX
+from core.project_io import load_project
+from core.scene import default_view_rect, project_scene
+from core.vector_export import DEFAULT_TOLERANCE, VECTOR_WRITERS
+from raster_export import export_png
+
+
+def export_raster(project, path, width, view_rect=None, line_width=None, progress=None):
+    """Render a loaded project to a PNG ``width`` pixels wide."""
+    view_rect = view_rect or default_view_rect()
+    # Sample the lines finely enough for the output resolution
+    tolerance = ADAPTIVE_TOLERANCE_PX * (view_rect[2] - view_rect[0]) / width
+    return export_png(project_scene(project, tolerance), path, width, view_rect, line_width,
+                      progress=progress)
+
+
+def export_vector(project, path, width, view_rect=None, line_width=None,
+                  tolerance=DEFAULT_TOLERANCE):
+    """Write a loaded project as SVG or PDF, chosen by the extension of ``path``.
+
+    ``width`` is the page width in SVG user units or PDF points and
+    ``tolerance`` the simplification tolerance in the same units.
+    """
+    writer = VECTOR_WRITERS[os.path.splitext(path)[1].lower()]
+    view_rect = view_rect or default_view_rect()
+    # Sample finer than the simplification tolerance, which then removes
+    # the points a straight segment can replace
+    sample_tolerance = 0.5 * tolerance * (view_rect[2] - view_rect[0]) / width
+    return writer(project_scene(project, sample_tolerance), path, width, view_rect, line_width,
+                  tolerance)
+
+
+def is_vector_path(path):
+    return os.path.splitext(path)[1].lower() in VECTOR_WRITERS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('project', help='.vacpa project file')
+    parser.add_argument('output', help='PNG, SVG or PDF file to write')
+    parser.add_argument('--width', type=int, help='image width in pixels (default 4000), '
+                        'or page width in points for SVG and PDF (default 1000)')
+    parser.add_argument('--line-width', type=float, help='line width in pixels or points')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='SVG and PDF simplification tolerance in points')
+    parser.add_argument('--view', type=float, nargs=4, metavar=('X0', 'Y0', 'X1', 'Y1'),
+                        help='plot area to export (default: the plot bounds)')
+    args = parser.parse_args(argv)
+
+    project = load_project(args.project)
+
+    if is_vector_path(args.output):
+        width, height = export_vector(project, args.output, args.width or 1000, args.view,
+                                      args.line_width, args.tolerance)
+        print(f'wrote {args.output} ({width:g}x{height:g})', file=sys.stderr)
+        return
+
+    def progress(done, total):
+        print(f'\r{done}/{total} rows', end='', file=sys.stderr, flush=True)
+
+    width, height = export_raster(project, args.output, args.width or 4000, args.view,
+                                  args.line_width, progress)
+    print(f'\nwrote {args.output} ({width}x{height})', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""OpenGL backend for the thick lines of the 2D plot.
+
+QPainter strokes every thick pen on the CPU.  :class:`GLLineItem` instead
+expands each polyline segment into a quad in a vertex shader and draws the
+outline and all line sets from one shared vertex buffer in a single call.
+It is used when the plot viewport is a QOpenGLWidget; anywhere else (e.g.
+pyqtgraph's exporters) it falls back to QPainter.
+"""
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+import pyqtgraph as pg
+from pyqtgraph.Qt import OpenGLConstants as GLC
+from pyqtgraph.Qt import OpenGLHelpers
+
+GL_UNSIGNED_BYTE = 0x1401
+
+# Per vertex: both ends of its segment in data coordinates, which end and
+# side of the quad it is, the pen width in pixels and the RGBA color
+VERTEX_DTYPE = np.dtype([
+    ('start', np.float32, 2),
+    ('end', np.float32, 2),
+    ('corner', np.float32, 2),
+    ('width', np.float32),
+    ('color', np.uint8, 4),
+])
+# Two triangles per segment, as (end, side) pairs
+QUAD_CORNERS = np.array([(0, -1), (0, 1), (1, -1), (1, -1), (0, 1), (1, 1)], dtype=np.float32)
+
+_VERTEX_BODY = """
+uniform mat4 u_mvp;
+uniform vec2 u_half_size;
+uniform float u_feather;
+void main() {
+    // Segment ends in pixels from the viewport centre
+    vec2 p0 = (u_mvp * vec4(a_start, 0.0, 1.0)).xy * u_half_size;
+    vec2 p1 = (u_mvp * vec4(a_end, 0.0, 1.0)).xy * u_half_size;
+    vec2 d = p1 - p0;
+    float len = length(d);
+    vec2 dir = len > 0.0 ? d / len : vec2(1.0, 0.0);
+    vec2 normal = vec2(-dir.y, dir.x);
+    float half_width = 0.5 * a_width;
+    float reach = half_width + u_feather;
+    // Square caps extend both ends by half the width, as QPen does.  With
+    // soft edges the overlapping caps would blend twice and show as dots
+    // along the line, so segments then end flush
+    float cap = u_feather > 0.0 ? 0.0 : half_width;
+    vec2 p = mix(p0, p1, a_corner.x) + dir * (2.0 * a_corner.x - 1.0) * cap
+             + normal * a_corner.y * reach;
+    gl_Position = vec4(p / u_half_size, 0.0, 1.0);
+    v_color = a_color;
+    v_side = a_corner.y * reach;
+    v_half_width = half_width;
+}
+"""
+_FRAGMENT_BODY = """
+uniform float u_feather;
+void main() {
+    // Coverage falls off over u_feather pixels at the edges; hard without
+    float alpha = u_feather > 0.0
+        ? clamp((v_half_width - abs(v_side)) / u_feather + 0.5, 0.0, 1.0)
+        : 1.0;
+    FRAG_COLOR = vec4(v_color.rgb, v_color.a * alpha);
+}
+"""
+VERTEX_SRC = """
+attribute vec2 a_start;
+attribute vec2 a_end;
+attribute vec2 a_corner;
+attribute float a_width;
+attribute vec4 a_color;
+varying vec4 v_color;
+varying float v_side;
+varying float v_half_width;
+""" + _VERTEX_BODY
+FRAGMENT_SRC = """
+#ifdef GL_ES
+precision mediump float;
+#endif
+varying vec4 v_color;
+varying float v_side;
+varying float v_half_width;
+#define FRAG_COLOR gl_FragColor
+""" + _FRAGMENT_BODY
+VERTEX_SRC_140 = """
+#version 140
+in vec2 a_start;
+in vec2 a_end;
+in vec2 a_corner;
+in float a_width;
+in vec4 a_color;
+out vec4 v_color;
+out float v_side;
+out float v_half_width;
+""" + _VERTEX_BODY
+FRAGMENT_SRC_140 = """
+#version 140
+in vec4 v_color;
+in float v_side;
+in float v_half_width;
+out vec4 fragColor;
+#define FRAG_COLOR fragColor
+""" + _FRAGMENT_BODY
+ATTRIBUTES = ('a_start', 'a_end', 'a_corner', 'a_width', 'a_color')
+
+
+def line_vertices(x, y, color, width, origin=(0.0, 0.0)):
+    """Triangle vertices of the NaN-separated polylines ``x``, ``y``.
+
+    ``color`` is RGBA in 0..1 and ``width`` the pen width in pixels.
+    Coordinates are stored relative to ``origin`` to keep float32 precise
+    when zoomed in.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    index = np.flatnonzero(finite[:-1] & finite[1:])
+    vertices = np.empty((len(index), len(QUAD_CORNERS)), dtype=VERTEX_DTYPE)
+    ox, oy = origin
+    vertices['start'][..., 0] = (x[index] - ox)[:, None]
+    vertices['start'][..., 1] = (y[index] - oy)[:, None]
+    vertices['end'][..., 0] = (x[index + 1] - ox)[:, None]
+    vertices['end'][..., 1] = (y[index + 1] - oy)[:, None]
+    vertices['corner'] = QUAD_CORNERS
+    vertices['width'] = width
+    rgba = tuple(color) + (1.0,) * (4 - len(color))
+    vertices['color'] = np.clip(np.round(np.asarray(rgba) * 255), 0, 255).astype(np.uint8)
+    return vertices.reshape(-1)
+
+
+class GLLineLayer:
+    """One polyline set drawn by a :class:`GLLineItem`.
+
+    Offers the parts of the ``PlotDataItem`` interface the render layer uses.
+    """
+
+    def __init__(self, item, color, width):
+        self.item = item
+        self.color = tuple(color)
+        self.width = width
+        self.visible = True
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.path = None
+
+    def setData(self, x, y, connect='finite'):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.path = None
+        self.item.layer_changed()
+
+    def setVisible(self, visible):
+        if visible != self.visible:
+            self.visible = visible
+            self.item.layer_changed()
+
+    def set_color(self, color):
+        self.color = tuple(color)
+        self.item.layer_changed()
+
+    def bounds(self):
+        finite = np.isfinite(self.x) & np.isfinite(self.y)
+        if not self.visible or not finite.any():
+            return None
+        x, y = self.x[finite], self.y[finite]
+        return x.min(), y.min(), x.max(), y.max()
+
+
+class _GLState(QtCore.QObject):
+    """GPU buffers of a :class:`GLLineItem` for one OpenGL context."""
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.context = None
+        self.nbytes = 0
+        self.vao = QtGui.QOpenGLVertexArrayObject(self)
+        self.vbo = QtGui.QOpenGLBuffer(QtGui.QOpenGLBuffer.VertexBuffer)
+
+    def setup(self, context, program):
+        if self.context is context:
+            return False
+        if self.context is not None:
+            self.context.aboutToBeDestroyed.disconnect(self.cleanup)
+            self.cleanup()
+        self.context = context
+        context.aboutToBeDestroyed.connect(self.cleanup)
+        self.vao.create()
+        self.vbo.create()
+        self.vbo.setUsagePattern(QtGui.QOpenGLBuffer.DynamicDraw)
+        self.nbytes = 0
+        self.vao.bind()
+        self.vbo.bind()
+        stride = VERTEX_DTYPE.itemsize
+        for location, name in enumerate(ATTRIBUTES):
+            field = name[2:]
+            kind, offset = VERTEX_DTYPE.fields[field]
+            size = kind.shape[0] if kind.shape else 1
+            gl_type = GL_UNSIGNED_BYTE if kind.base == np.uint8 else GLC.GL_FLOAT
+            program.enableAttributeArray(location)
+            # Qt normalizes integer attributes, so colors arrive in 0..1
+            program.setAttributeBuffer(location, gl_type, offset, size, stride)
+        self.vbo.release()
+        self.vao.release()
+        return True
+
+    def upload(self, vertices):
+        self.vbo.bind()
+        if vertices.nbytes > self.nbytes:
+            self.vbo.allocate(vertices.nbytes)
+            self.nbytes = vertices.nbytes
+        if vertices.nbytes:
+            self.vbo.write(0, vertices, vertices.nbytes)
+        self.vbo.release()
+
+    def cleanup(self):
+        widget = self.parent()
+        widget.makeCurrent()
+        self.vbo.destroy()
+        self.vao.destroy()
+        self.context = None
+        self.nbytes = 0
+        widget.doneCurrent()
+
+
+class GLLineItem(pg.GraphicsObject):
+    """Draws any number of polyline layers with a single OpenGL draw call.
+
+    Layers are drawn in the order they were added.  Vertices are rebuilt at
+    most once per paint, however many layers changed.
+    """
+
+    def __init__(self, antialias=None):
+        super().__init__()
+        self.layers = []
+        self.antialias = pg.getConfigOption('antialias') if antialias is None else antialias
+        self._vertices = None
+        self._vertex_count = 0
+        self._uploaded = False
+        self._origin = (0.0, 0.0)
+        self._data_bounds = None
+        self._glstate = None
+
+    def add_layer(self, color, width):
+        layer = GLLineLayer(self, color, width)
+        self.layers.append(layer)
+        return layer
+
+    def remove_layer(self, layer):
+        self.layers.remove(layer)
+        self.layer_changed()
+
+    def layer_changed(self):
+        self._vertices = None
+        self._uploaded = False
+        bounds = [b for b in (layer.bounds() for layer in self.layers) if b is not None]
+        if bounds:
+            bounds = np.array(bounds)
+            data_bounds = (*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0))
+        else:
+            data_bounds = None
+        if data_bounds != self._data_bounds:
+            self.prepareGeometryChange()
+            self._data_bounds = data_bounds
+        self.update()
+
+    def vertices(self):
+        """Vertices of every visible layer, rebuilt after changes."""
+        if self._vertices is None:
+            if self._data_bounds is not None:
+                x0, y0, x1, y1 = self._data_bounds
+                self._origin = (0.5 * (x0 + x1), 0.5 * (y0 + y1))
+            parts = [line_vertices(layer.x, layer.y, layer.color, layer.width, self._origin)
+                     for layer in self.layers if layer.visible]
+            self._vertices = np.concatenate(parts) if parts else np.empty(0, dtype=VERTEX_DTYPE)
+        return self._vertices
+
+    def viewTransformChanged(self):
+        # The pen padding of the bounding rect is in pixels
+        self.prepareGeometryChange()
+
+    def boundingRect(self):
+        if self._data_bounds is None:
+            return QtCore.QRectF()
+        x0, y0, x1, y1 = self._data_bounds
+        widest = max((layer.width for layer in self.layers if layer.visible), default=0)
+        px = self.pixelLength(QtCore.QPointF(1, 0)) or 0.0
+        py = self.pixelLength(QtCore.QPointF(0, 1)) or 0.0
+        pad_x, pad_y = widest * px, widest * py
+        return QtCore.QRectF(x0 - pad_x, y0 - pad_y, x1 - x0 + 2 * pad_x, y1 - y0 + 2 * pad_y)
+
+    def paint(self, painter, option, widget):
+        if isinstance(widget, OpenGLHelpers.GraphicsViewGLWidget) and widget.context() is not None:
+            painter.beginNativePainting()
+            try:
+                self.paint_gl(widget)
+            finally:
+                painter.endNativePainting()
+            return
+        self.paint_qpainter(painter)
+
+    def paint_qpainter(self, painter):
+        """Draw the layers with QPainter, for widgets without OpenGL."""
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, self.antialias)
+        for layer in self.layers:
+            if not layer.visible or len(layer.x) < 2:
+                continue
+            if layer.path is None:
+                layer.path = pg.arrayToQPath(layer.x, layer.y, connect='finite')
+            painter.setPen(pg.mkPen(QtGui.QColor.fromRgbF(*layer.color[:3]), width=layer.width))
+            painter.drawPath(layer.path)
+
+    def _program(self, widget):
+        program = widget.retrieveProgram('GLLineItem')
+        if program is not None:
+            return program
+        program = QtGui.QOpenGLShaderProgram()
+        context = widget.context()
+        if not context.isOpenGLES() and context.format().version() >= (3, 1):
+            sources = (VERTEX_SRC_140, FRAGMENT_SRC_140)
+        else:
+            sources = (VERTEX_SRC, FRAGMENT_SRC)
+        for kind, source in zip((QtGui.QOpenGLShader.Vertex, QtGui.QOpenGLShader.Fragment), sources):
+            if not program.addShaderFromSourceCode(kind, source):
+                raise RuntimeError(program.log())
+        for location, name in enumerate(ATTRIBUTES):
+            program.bindAttributeLocation(name, location)
+        if not program.link():
+            raise RuntimeError(program.log())
+        widget.storeProgram('GLLineItem', program)
+        return program
+
+    def paint_gl(self, widget):
+        view = self.getViewBox()
+        if view is None:
+            return
+        vertices = self.vertices()
+        if not len(vertices):
+            return
+        program = self._program(widget)
+        if self._glstate is None:
+            self._glstate = _GLState(widget)
+        if self._glstate.setup(widget.context(), program):
+            self._uploaded = False
+        if not self._uploaded:
+            self._glstate.upload(vertices)
+            self._uploaded = True
+
+        projection = QtGui.QMatrix4x4()
+        projection.ortho(QtCore.QRectF(widget.rect()))
+        transform = self.sceneTransform()
+        transform.translate(*self._origin)
+        mvp = projection * QtGui.QMatrix4x4(transform)
+
+        functions = widget.getFunctions()
+        widget.setViewboxClip(view)
+        functions.glEnable(GLC.GL_BLEND)
+        functions.glBlendFuncSeparate(GLC.GL_SRC_ALPHA, GLC.GL_ONE_MINUS_SRC_ALPHA,
+                                      1, GLC.GL_ONE_MINUS_SRC_ALPHA)
+        self._glstate.vao.bind()
+        program.bind()
+        OpenGLHelpers.setUniformValue(program, 'u_mvp', mvp)
+        OpenGLHelpers.setUniformValue(program, 'u_half_size',
+                                      QtGui.QVector2D(widget.width() / 2, widget.height() / 2))
+        OpenGLHelpers.setUniformValue(program, 'u_feather', 1.0 if self.antialias else 0.0)
+        functions.glDrawArrays(GLC.GL_TRIANGLES, 0, len(vertices))
+        program.release()
+        self._glstate.vao.release()
+        functions.glDisable(GLC.GL_BLEND)
+
+
+def opengl_available():
+    """Whether an OpenGL context can be created for a GPU plot viewport."""
+    context = QtGui.QOpenGLContext()
+    return context.create()
+
+
+def set_opengl_viewport(plot_widget, enabled):
+    """Switch ``plot_widget`` between an OpenGL and a raster viewport.
+
+    Returns whether the viewport now uses OpenGL.
+    """
+    plot_widget.useOpenGL(enabled)
+    return isinstance(plot_widget.viewport(), QtWidgets.QOpenGLWidget)
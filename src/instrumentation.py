@@ -0,0 +1,160 @@
+import contextlib
+import csv
+import time
+
+import numpy as np
+from PyQt5 import QtWidgets, QtCore
+
+# Per-frame stages, in seconds.  'project' runs on the projection worker;
+# showing its result on the GUI thread is split into 'projection' (switching
+# the outline and seam handling) and 'items' (updating the plot items).
+# 'frame' is the GUI-thread total rotate + gl_upload + projection + items.
+STAGES = ('rotate', 'gl_upload', 'queue', 'project', 'items', 'projection', 'frame')
+_FRAME_PARTS = [STAGES.index(name) for name in ('rotate', 'gl_upload', 'projection', 'items')]
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _StageTimer:
+    """Context manager adding its elapsed time to one stage of the frame."""
+
+    __slots__ = ('profiler', 'index', 'start')
+
+    def __init__(self, profiler, index):
+        self.profiler = profiler
+        self.index = index
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler._pending[self.index] += time.perf_counter() - self.start
+
+
+class FrameProfiler:
+    """Opt-in per-frame stage timings kept in a fixed-size ring buffer.
+
+    While disabled every hook is a no-op, so the instrumentation can stay in
+    the render path permanently.
+    """
+
+    def __init__(self, capacity=600):
+        self.enabled = False
+        self.capacity = capacity
+        self._samples = np.full((capacity, len(STAGES)), np.nan)
+        self._pending = np.zeros(len(STAGES))
+        self._started = {}
+        self._timers = [_StageTimer(self, index) for index in range(len(STAGES))]
+        self.frame_count = 0
+
+    def set_enabled(self, enabled):
+        """Turn recording on or off; turning it on starts a fresh buffer."""
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def reset(self):
+        """Forget every recorded frame."""
+        self._samples.fill(np.nan)
+        self._pending.fill(0)
+        self._started.clear()
+        self.frame_count = 0
+
+    def stage(self, name):
+        """Return a context manager timing one stage of the current frame."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timers[STAGES.index(name)]
+
+    def start(self, name):
+        """Start timing a stage that ends in a different call (see :meth:`stop`)."""
+        if self.enabled:
+            self._started.setdefault(name, time.perf_counter())
+
+    def stop(self, name):
+        """Stop timing a stage started with :meth:`start`."""
+        started = self._started.pop(name, None)
+        if self.enabled and started is not None:
+            self._pending[STAGES.index(name)] += time.perf_counter() - started
+
+    def add(self, name, seconds):
+        """Add a duration measured elsewhere (e.g. on a worker) to a stage."""
+        if self.enabled:
+            self._pending[STAGES.index(name)] += seconds
+
+    def end_frame(self):
+        """Commit the stages timed since the last frame as one sample."""
+        if not self.enabled:
+            return
+        self._pending[STAGES.index('frame')] = self._pending[_FRAME_PARTS].sum()
+        self._samples[self.frame_count % self.capacity] = self._pending
+        self._pending.fill(0)
+        self.frame_count += 1
+
+    def samples(self):
+        """Return the recorded frames, oldest first, as an ``(n, stages)`` array."""
+        if self.frame_count <= self.capacity:
+            return self._samples[:self.frame_count].copy()
+        split = self.frame_count % self.capacity
+        return np.concatenate([self._samples[split:], self._samples[:split]])
+
+    def percentiles(self, name, q=(50, 95)):
+        """Return the ``q`` percentiles of a stage in seconds (NaN if empty)."""
+        column = self.samples()[:, STAGES.index(name)]
+        if not len(column):
+            return tuple(np.nan for _ in q)
+        return tuple(np.percentile(column, q))
+
+    def dump_csv(self, path):
+        """Write the recorded frames to ``path`` as CSV, in milliseconds."""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + [f'{name}_ms' for name in STAGES])
+            first = max(self.frame_count - self.capacity, 0)
+            for offset, row in enumerate(self.samples()):
+                writer.writerow([first + offset] + [f'{value * 1e3:.4f}' for value in row])
+
+
+class PerformanceHud(QtWidgets.QLabel):
+    """Overlay in the corner of a widget showing p50/p95 stage timings."""
+
+    REFRESH_MS = 500
+
+    def __init__(self, profiler, parent, scheduler=None):
+        super().__init__(parent)
+        self.profiler = profiler
+        self.scheduler = scheduler
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet(
+            "QLabel { background-color: rgba(255, 255, 255, 200); color: #222;"
+            " font-family: monospace; font-size: 11px; padding: 4px;"
+            " border: 1px solid #aaa; }"
+        )
+        self.move(8, 8)
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_active(self, active):
+        """Show and periodically refresh the overlay, or hide it."""
+        if active:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start(self.REFRESH_MS)
+        else:
+            self.timer.stop()
+            self.hide()
+
+    def refresh(self):
+        """Redraw the overlay text from the profiler's ring buffer."""
+        lines = [f"{'stage':<11}{'p50 ms':>9}{'p95 ms':>9}"]
+        for name in STAGES:
+            p50, p95 = self.profiler.percentiles(name)
+            lines.append(f"{name:<11}{p50 * 1e3:9.2f}{p95 * 1e3:9.2f}")
+        lines.append(f"frames: {self.profiler.frame_count}")
+        if self.scheduler is not None:
+            lines.append(f"dropped: {self.scheduler.dropped_frames}"
+                         f"  coalesced: {self.scheduler.coalesced_requests}")
+        self.setText('\n'.join(lines))
+        self.adjustSize()
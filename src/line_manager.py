@@ -1,8 +1,13 @@
-import numpy as np
+import itertools
+
 from PyQt5 import QtWidgets, QtCore
 import pyqtgraph.opengl as gl
 
-from constants import r, LINE_WIDTH
+from core.constants import LINE_WIDTH, LINE_SAMPLES
+from core.geometry import longitude_family
+from core.scene import DEFAULT_LINE_SETS
+
+_set_ids = itertools.count(1)
 
 
 class LineManagerMixin:
@@ -12,72 +17,141 @@ class LineManagerMixin:
 
     def create_default_lines(self):
         """Create default longitude line sets"""
-        self.add_line_set(self.tr('longitudes_x'), (90, 0), 16, (1, 0, 0, 1))
-        self.add_line_set(self.tr('longitudes_y'), (90, 90), 16, (0, 1, 0, 1))
-        self.add_line_set(self.tr('longitudes_z'), (0, 0), 16, (0, 0, 1, 1))
+        for key, direction, divisions, color in DEFAULT_LINE_SETS:
+            self.add_line_set(self.tr(key), direction, divisions, color)
 
-    def generate_longitude_lines(self, direction, divisions, color, visible=True):
+    def generate_longitude_lines(self, direction, divisions):
         """Generate longitude lines for a given spherical direction"""
-        lines = []
-        t = np.linspace(0, np.pi, 100)
-        theta = np.radians(direction[0])
-        phi = np.radians(direction[1])
-        d = np.array([
-            np.sin(theta) * np.cos(phi),
-            np.sin(theta) * np.sin(phi),
-            np.cos(theta),
-        ])
-        if np.allclose(d, [0, 0, 1]):
-            e1 = np.array([1, 0, 0])
+        family = longitude_family(tuple(direction), divisions, LINE_SAMPLES)
+        return [{'coords': pts} for pts in family]
+
+    def build_gl_items(self, set_data):
+        """Create or recycle the 3D items of a line set
+
+        While the 3D view is hidden this only marks the set dirty; the items
+        are brought up to date when the view is shown.
+        """
+        if not self.gl_view_active():
+            set_data['gl_dirty'] = True
+            return
+        items = list(set_data.get('gl_items', ()))
+        new_items = []
+        for obj in set_data['lines']:
+            if items:
+                item = items.pop()
+                item.setData(pos=obj['coords'], color=set_data['color'])
+            else:
+                item = gl.GLLinePlotItem(pos=obj['coords'], width=LINE_WIDTH, color=set_data['color'])
+                self.view.addItem(item)
+            item.setVisible(set_data['visible'])
+            new_items.append(item)
+        for item in items:
+            self.view.removeItem(item)
+        set_data['gl_items'] = new_items
+        set_data['gl_dirty'] = False
+
+    def remove_gl_items(self, set_data):
+        """Remove the 3D items of a line set from the view"""
+        for item in set_data.pop('gl_items', ()):
+            self.view.removeItem(item)
+
+    def register_geometry(self, set_data):
+        """Pack the base coordinates of a line set into the geometry store
+
+        The set's lines are then replaced by views of the store's copy, so
+        no memory map of a loaded project file stays open.
+        """
+        self.geometry.add(set_data['id'], [obj['coords'] for obj in set_data['lines']])
+        set_data['lines'] = [{'coords': pts} for pts in self.geometry.base_lines(set_data['id'])]
+
+    def add_line_set(self, name, direction, divisions, color, visible=True, lines=None):
+        """Add a new set of longitude lines
+
+        ``lines`` may hold the precomputed coordinates of every line (e.g.
+        from a project file), in which case nothing is regenerated.
+        Returns the new set.
+        """
+        if lines is None:
+            lines = self.generate_longitude_lines(direction, divisions)
         else:
-            e1 = np.cross(d, [0, 0, 1])
-            e1 = e1 / np.linalg.norm(e1)
-        e2 = np.cross(d, e1)
-        for i in range(divisions):
-            angle = 2 * np.pi * i / divisions
-            v = np.cos(angle) * e1 + np.sin(angle) * e2
-            x = r * (np.cos(t) * d[0] + np.sin(t) * v[0])
-            y = r * (np.cos(t) * d[1] + np.sin(t) * v[1])
-            z = r * (np.cos(t) * d[2] + np.sin(t) * v[2])
-            pts = np.vstack([x, y, z]).T.astype(np.float32)
-            line = gl.GLLinePlotItem(pos=pts, width=LINE_WIDTH, color=color)
-            line.setVisible(visible)
-            self.view.addItem(line)
-            lines.append({'line': line, 'coords': (x, y, z)})
-        return lines
-
-    def add_line_set(self, name, direction, divisions, color):
-        """Add a new set of longitude lines"""
-        lines = self.generate_longitude_lines(direction, divisions, color, True)
+            lines = [{'coords': pts} for pts in lines]
         set_data = {
+            'id': next(_set_ids),
             'name': name,
             'direction': direction,
             'divisions': divisions,
             'color': color,
-            'visible': True,
+            'visible': visible,
             'lines': lines,
         }
-        self.line_sets.append(set_data)
-        self.update_line_list()
+        self.line_model.append(set_data)
+        self.register_geometry(set_data)
+        self.build_gl_items(set_data)
+        return set_data
+
+    def clear_line_sets(self):
+        """Remove every line set"""
+        for set_data in self.line_sets:
+            self.remove_gl_items(set_data)
+        self.geometry.clear()
+        self.line_model.clear()
+        self.line_controls.setVisible(False)
 
-    def update_line_list(self):
-        """Update the list of line sets in the UI"""
-        self.line_list.clear()
-        for idx, set_data in enumerate(self.line_sets):
-            item = QtWidgets.QListWidgetItem(set_data['name'])
-            item.setData(QtCore.Qt.UserRole, idx)
-            self.line_list.addItem(item)
+    def load_scene(self, project):
+        """Replace the scene with the contents of a loaded project file"""
+        self.clear_line_sets()
+        with self.line_model.bulk_update():
+            for entry in project['line_sets']:
+                self.add_line_set(
+                    entry['name'],
+                    tuple(entry['direction']),
+                    entry['divisions'],
+                    tuple(entry['color']),
+                    entry['visible'],
+                    entry.get('lines'),
+                )
+        index = self.projection_combo.findData(project.get('projection'))
+        if index >= 0:
+            self.projection_combo.setCurrentIndex(index)
+        self.set_rotation_degrees(project.get('rotation', {}))
+        self.schedule_3d_update()
+
+    def filter_line_list(self, text):
+        """Show only the line sets whose name contains ``text``"""
+        if text:
+            # Sets not fetched into the model yet could not match
+            self.line_model.fetch_all()
+        self.line_proxy.setFilterFixedString(text)
+
+    def selected_line_sets(self):
+        """Return the line sets selected in the list"""
+        return [
+            self.line_model.set_at(self.line_proxy.mapToSource(index))
+            for index in self.line_list.selectionModel().selectedIndexes()
+        ]
+
+    def selected_line_set(self):
+        """Return the line set edited by the controls, or None
+
+        With several sets selected this is the current one.
+        """
+        selection = self.line_list.selectionModel()
+        current = self.line_list.currentIndex()
+        if current.isValid() and selection.isSelected(current):
+            return self.line_model.set_at(self.line_proxy.mapToSource(current))
+        selected = selection.selectedIndexes()
+        if not selected:
+            return None
+        return self.line_model.set_at(self.line_proxy.mapToSource(selected[0]))
 
     def on_line_selected(self):
         """Handle line set selection in the list"""
-        selected = self.line_list.selectedItems()
-        if not selected:
+        set_data = self.selected_line_set()
+        if set_data is None:
             self.line_controls.setVisible(False)
             return
 
         self.line_controls.setVisible(True)
-        set_idx = selected[0].data(QtCore.Qt.UserRole)
-        set_data = self.line_sets[set_idx]
         self.line_visible.blockSignals(True)
         self.theta_spin.blockSignals(True)
         self.phi_spin.blockSignals(True)
@@ -93,59 +167,59 @@ class LineManagerMixin:
         self.divisions_spin.blockSignals(False)
 
     def update_selected_line_set(self):
-        """Update the selected line set based on UI controls"""
-        selected = self.line_list.selectedItems()
-        if not selected:
-            return
+        """Update the selected line set based on UI controls
 
-        set_idx = selected[0].data(QtCore.Qt.UserRole)
-        set_data = self.line_sets[set_idx]
+        Only the edited set is regenerated, rotated and reprojected; hiding
+        a set only hides its items.
+        """
+        set_data = self.selected_line_set()
+        if set_data is None:
+            return
 
-        set_data['visible'] = self.line_visible.isChecked()
-        for line_obj in set_data['lines']:
-            line_obj['line'].setVisible(set_data['visible'])
+        shown = self.line_visible.isChecked() and not set_data['visible']
+        if set_data['visible'] != self.line_visible.isChecked():
+            set_data['visible'] = self.line_visible.isChecked()
+            self.line_model.set_changed(set_data['id'])
+        for item in set_data.get('gl_items', ()):
+            item.setVisible(set_data['visible'])
 
         theta = self.theta_spin.value()
         phi = self.phi_spin.value()
         divisions = self.divisions_spin.value()
         if (theta, phi) != set_data['direction'] or divisions != set_data['divisions']:
-            for line_obj in set_data['lines']:
-                self.view.removeItem(line_obj['line'])
             set_data['direction'] = (theta, phi)
             set_data['divisions'] = divisions
-            set_data['lines'] = self.generate_longitude_lines((theta, phi), divisions, set_data['color'], set_data['visible'])
-
-        self.update_3d()
-        self.schedule_projection_update()
+            set_data['lines'] = self.generate_longitude_lines((theta, phi), divisions)
+            self.register_geometry(set_data)
+            self.build_gl_items(set_data)
+            self.schedule_set_update(set_data['id'])
+        elif shown:
+            # Hidden sets are not projected
+            self.schedule_projection_update()
+        else:
+            self.schedule_items_update()
 
     def change_line_color(self):
         """Change color of selected line set"""
-        selected = self.line_list.selectedItems()
-        if not selected:
+        set_data = self.selected_line_set()
+        if set_data is None:
             return
 
-        set_idx = selected[0].data(QtCore.Qt.UserRole)
-        set_data = self.line_sets[set_idx]
-
         color = QtWidgets.QColorDialog.getColor()
         if color.isValid():
             r_val, g_val, b_val, a_val = color.getRgbF()
             set_data['color'] = (r_val, g_val, b_val, a_val)
-            for line_obj in set_data['lines']:
-                line_obj['line'].setData(color=set_data['color'])
-            self.update_projection()
-
-        self.schedule_projection_update()
+            for item in set_data.get('gl_items', ()):
+                item.setData(color=set_data['color'])
+            self.line_model.set_changed(set_data['id'])
+            self.schedule_items_update()
 
     def rename_selected_line_set(self):
         """Rename the selected line set"""
-        selected = self.line_list.selectedItems()
-        if not selected:
+        set_data = self.selected_line_set()
+        if set_data is None:
             return
 
-        set_idx = selected[0].data(QtCore.Qt.UserRole)
-        set_data = self.line_sets[set_idx]
-
         new_name, ok = QtWidgets.QInputDialog.getText(
             self,
             self.tr('rename_line_set_title'),
@@ -155,28 +229,21 @@ class LineManagerMixin:
 
         if ok and new_name:
             set_data['name'] = new_name
-            self.update_line_list()
-            for i in range(self.line_list.count()):
-                if self.line_list.item(i).data(QtCore.Qt.UserRole) == set_idx:
-                    self.line_list.setCurrentRow(i)
-                    break
-
-    def delete_selected_line_set(self):
-        """Delete the selected line set"""
-        selected = self.line_list.selectedItems()
+            self.line_model.set_changed(set_data['id'])
+
+    def delete_selected_line_sets(self):
+        """Delete every line set selected in the list"""
+        selected = self.selected_line_sets()
         if not selected:
             return
 
-        set_idx = selected[0].data(QtCore.Qt.UserRole)
-        set_data = self.line_sets[set_idx]
-
-        for line_obj in set_data['lines']:
-            self.view.removeItem(line_obj['line'])
-        del self.line_sets[set_idx]
-        self.update_line_list()
-        self.line_controls.setVisible(False)
-        self.update_projection()
-        self.schedule_projection_update()
+        # Clearing the selection first keeps it from moving to the next set
+        self.line_list.selectionModel().clear()
+        for set_data in selected:
+            self.remove_gl_items(set_data)
+            self.geometry.remove(set_data['id'])
+        self.line_model.remove([set_data['id'] for set_data in selected])
+        self.schedule_items_update()
 
     def show_add_line_dialog(self):
         """Show dialog to add new longitude line set"""
@@ -234,6 +301,5 @@ class LineManagerMixin:
             name = name_edit.text() or self.tr('unnamed')
             direction = (theta_spin.value(), phi_spin.value())
             divisions = divisions_spin.value()
-            self.add_line_set(name, direction, divisions, selected_color)
-            self.update_3d()
-            self.schedule_projection_update()
+            set_data = self.add_line_set(name, direction, divisions, selected_color)
+            self.schedule_set_update(set_data['id'])
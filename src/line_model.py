@@ -0,0 +1,145 @@
+import contextlib
+
+from PyQt5 import QtCore, QtGui
+
+# Role holding the stable id of a line set
+SET_ID_ROLE = QtCore.Qt.UserRole
+# Rows handed to the view per fetchMore call
+FETCH_BATCH = 256
+
+
+class LineSetModel(QtCore.QAbstractListModel):
+    """List model over the window's line sets.
+
+    The model wraps the ``line_sets`` list itself; sets are added, removed
+    and changed through the model so views receive row insertions, removals
+    and ``dataChanged`` instead of being rebuilt.  Rows are identified by
+    the sets' stable ids, never by their position.  Large scenes are shown
+    lazily: views load rows ``FETCH_BATCH`` at a time while scrolling.
+    """
+
+    def __init__(self, line_sets, parent=None):
+        super().__init__(parent)
+        self._sets = line_sets
+        # Row of every set by id; rebuilt on the next lookup after removals
+        self._rows = None
+        self._loaded = min(len(line_sets), FETCH_BATCH)
+        self._bulk = False
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._loaded:
+            return None
+        set_data = self._sets[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return set_data['name']
+        if role == QtCore.Qt.DecorationRole:
+            return QtGui.QColor.fromRgbF(*set_data['color'][:3])
+        if role == QtCore.Qt.ForegroundRole and not set_data['visible']:
+            return QtGui.QBrush(QtCore.Qt.gray)
+        if role == SET_ID_ROLE:
+            return set_data['id']
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._sets)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self._sets) - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """Load every remaining row, e.g. before filtering."""
+        if self._loaded < len(self._sets):
+            self.beginInsertRows(QtCore.QModelIndex(), self._loaded, len(self._sets) - 1)
+            self._loaded = len(self._sets)
+            self.endInsertRows()
+
+    def _row_index(self):
+        if self._rows is None:
+            self._rows = {set_data['id']: row for row, set_data in enumerate(self._sets)}
+        return self._rows
+
+    def row_of(self, set_id):
+        """Return the row of the set with id ``set_id``, or -1."""
+        return self._row_index().get(set_id, -1)
+
+    def set_at(self, index):
+        """Return the line set of a model index."""
+        return self._sets[index.row()]
+
+    @contextlib.contextmanager
+    def bulk_update(self):
+        """Reset views once after adding or removing many sets in the block."""
+        self.beginResetModel()
+        self._bulk = True
+        try:
+            yield
+        finally:
+            self._bulk = False
+            self._loaded = min(len(self._sets), FETCH_BATCH)
+            self.endResetModel()
+
+    def append(self, set_data):
+        """Add a line set at the end.
+
+        The new row is announced right away when every earlier row is
+        loaded; otherwise it is fetched with the rest.
+        """
+        row = len(self._sets)
+        if self._rows is not None:
+            self._rows[set_data['id']] = row
+        if self._bulk or self._loaded < row:
+            self._sets.append(set_data)
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._sets.append(set_data)
+        self._loaded += 1
+        self.endInsertRows()
+
+    def remove(self, set_ids):
+        """Remove the line sets with the ids ``set_ids``.
+
+        Runs of adjacent rows are removed together, last run first, and the
+        row index is rebuilt once afterwards.
+        """
+        index = self._row_index()
+        rows = sorted((index[set_id] for set_id in set(set_ids) if set_id in index), reverse=True)
+        runs = []
+        for row in rows:
+            if runs and runs[-1][0] == row + 1:
+                runs[-1][0] = row
+            else:
+                runs.append([row, row])
+        for first, last in runs:
+            if self._bulk or first >= self._loaded:
+                del self._sets[first:last + 1]
+                continue
+            last_loaded = min(last, self._loaded - 1)
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last_loaded)
+            del self._sets[first:last + 1]
+            self._loaded -= last_loaded - first + 1
+            self.endRemoveRows()
+        if runs:
+            self._rows = None
+
+    def clear(self):
+        """Remove every line set."""
+        with self.bulk_update():
+            self._sets.clear()
+            self._rows = None
+
+    def set_changed(self, set_id):
+        """Notify views that the name, color or visibility of a set changed."""
+        row = self.row_of(set_id)
+        if 0 <= row < self._loaded:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
@@ -0,0 +1,410 @@
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5 import QtCore, QtGui
+import pyqtgraph as pg
+
+from core.constants import PLOT_BOUNDS
+from core.reprojection import RemapCache, reproject_image
+
+TILE_SIZE = 512
+# Longest side of reprojected overlays and of the source image they sample
+REPROJECTION_SIZE = 1536
+REPROJECTION_SOURCE_SIZE = 4096
+# Largest level, in pixels, decoded whole for formats that cannot decode a
+# sub-rectangle; finer levels of those formats are not used
+MAX_LEVEL_PIXELS = 4096 * 4096
+# Overlay tiles are drawn below the guidelines and the projection outline
+OVERLAY_Z = -10
+
+
+def qimage_to_array(image):
+    """Copy a QImage into an ``(h, w, 4)`` uint8 RGBA array."""
+    image = image.convertToFormat(QtGui.QImage.Format_RGBA8888)
+    width, height = image.width(), image.height()
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * height)
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape(height, image.bytesPerLine())
+    return rows[:, :4 * width].reshape(height, width, 4).copy()
+
+
+def read_image(path, max_side=None):
+    """Decode an image file into an RGBA array, scaled down to ``max_side``."""
+    reader = QtGui.QImageReader(path)
+    size = reader.size()
+    if max_side is not None and size.isValid() and max(size.width(), size.height()) > max_side:
+        reader.setScaledSize(size.scaled(max_side, max_side, QtCore.Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString() or f'cannot read {path}')
+    return qimage_to_array(image)
+
+
+class TileSource:
+    """Tiles of an image at power-of-two scales.
+
+    Level 0 is the full resolution and every level halves it, down to a
+    level that fits in a single tile.  ``rect`` is the plot rectangle
+    ``(x, y, w, h)`` the image covers, or None to fit it into PLOT_BOUNDS.
+    Levels finer than ``min_level`` are not read; views zoomed in further
+    show ``min_level`` magnified.
+    """
+
+    # Sources that can cut tiles without decoding are read synchronously
+    in_memory = False
+    partial = True
+    rect = None
+    min_level = 0
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.levels = max(0, math.ceil(math.log2(max(width, height) / TILE_SIZE))) + 1
+
+    def level_size(self, level):
+        """Pixel size ``(width, height)`` of a level."""
+        scale = 2 ** level
+        return -(-self.width // scale), -(-self.height // scale)
+
+    def tile_count(self, level):
+        """Number of tiles ``(columns, rows)`` of a level."""
+        width, height = self.level_size(level)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+
+    def read(self, level, tx, ty):
+        """Return ``{(level, tx, ty): array}`` with at least the requested tile."""
+        raise NotImplementedError
+
+
+class ArrayTileSource(TileSource):
+    """Tiles of an RGBA array already in memory, e.g. a reprojected image."""
+
+    in_memory = True
+
+    def __init__(self, pixels, extent):
+        super().__init__(pixels.shape[1], pixels.shape[0])
+        self.pixels = pixels
+        x_min, y_min, x_max, y_max = extent
+        self.rect = (x_min, y_min, x_max - x_min, y_max - y_min)
+
+    def read(self, level, tx, ty):
+        scale = 2 ** level
+        span = TILE_SIZE * scale
+        block = self.pixels[ty * span:(ty + 1) * span:scale, tx * span:(tx + 1) * span:scale]
+        return {(level, tx, ty): np.ascontiguousarray(block)}
+
+
+class ImageTileSource(TileSource):
+    """Lazily decoded tiles of an image file.
+
+    Formats whose reader can decode a sub-rectangle (JPEG, TIFF, ...) are
+    read one tile at a time.  For the others (e.g. PNG) Qt can only decode
+    the whole image, so a whole level is decoded at once and cut into
+    tiles, and only levels of at most ``MAX_LEVEL_PIXELS`` are used: a
+    large PNG is shown at that resolution at most.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        reader = QtGui.QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            raise ValueError(reader.errorString() or f'cannot read {path}')
+        super().__init__(size.width(), size.height())
+        self.partial = reader.supportsOption(QtGui.QImageIOHandler.ClipRect)
+        if not self.partial:
+            while self.min_level < self.levels - 1:
+                width, height = self.level_size(self.min_level)
+                if width * height <= MAX_LEVEL_PIXELS:
+                    break
+                self.min_level += 1
+
+    def _source_rect(self, level, tx, ty):
+        """Level-0 pixel rectangle of a tile, clipped to the image."""
+        span = TILE_SIZE * 2 ** level
+        x, y = tx * span, ty * span
+        return QtCore.QRect(x, y, min(span, self.width - x), min(span, self.height - y))
+
+    def read(self, level, tx, ty):
+        if not self.partial:
+            return self._read_level(level)
+        src = self._source_rect(level, tx, ty)
+        reader = QtGui.QImageReader(self.path)
+        reader.setClipRect(src)
+        scale = 2 ** level
+        reader.setScaledSize(QtCore.QSize(-(-src.width() // scale), -(-src.height() // scale)))
+        image = reader.read()
+        if image.isNull():
+            raise ValueError(reader.errorString())
+        return {(level, tx, ty): qimage_to_array(image)}
+
+    def _read_level(self, level):
+        if level < self.min_level:
+            raise ValueError(f'level {level} is above the decoding budget')
+        reader = QtGui.QImageReader(self.path)
+        reader.setScaledSize(QtCore.QSize(*self.level_size(level)))
+        image = reader.read()
+        if image.isNull():
+            raise ValueError(reader.errorString())
+        pixels = qimage_to_array(image)
+        columns, rows = self.tile_count(level)
+        return {
+            (level, tx, ty): pixels[ty * TILE_SIZE:(ty + 1) * TILE_SIZE,
+                                    tx * TILE_SIZE:(tx + 1) * TILE_SIZE].copy()
+            for tx in range(columns) for ty in range(rows)
+        }
+
+
+class TileMemoryCache:
+    """LRU cache of decoded tiles, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._tiles
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        old = self._tiles.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._tiles.clear()
+        self.nbytes = 0
+
+
+class ImageOverlayLayer(QtCore.QObject):
+    """Reference image drawn under the guidelines from a mip-mapped tile pyramid.
+
+    The image is fitted into ``PLOT_BOUNDS``.  On every view change the
+    level matching the screen resolution is chosen and only the tiles of
+    that level intersecting the view get an ``ImageItem``; tiles that are
+    not decoded yet are requested from a background pool and covered by the
+    closest cached coarser tile meanwhile.
+    """
+
+    tiles_loaded = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, plot_widget, max_bytes=256 * 2 ** 20, parent=None):
+        super().__init__(parent)
+        self.plot_widget = plot_widget
+        self.cache = TileMemoryCache(max_bytes)
+        self.source = None
+        self.rect = None
+        self.opacity = 1.0
+        self._items = {}
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='overlay-tiles')
+        self._view = None
+        self.tiles_loaded.connect(self._on_tiles_loaded)
+
+    def set_source(self, source):
+        """Show ``source`` (a :class:`TileSource`), or nothing if None."""
+        for item in self._items.values():
+            self.plot_widget.removeItem(item)
+        self._items.clear()
+        self.cache.clear()
+        with self._lock:
+            self._pending.clear()
+            self._failed.clear()
+        self.source = source
+        if source is not None:
+            self.rect = source.rect or self._fit(source.width, source.height)
+            if not source.in_memory:
+                # The single coarsest tile stands in for anything not loaded yet
+                self._request((source.levels - 1, 0, 0))
+        if self._view is not None:
+            self.update_view(*self._view)
+
+    def set_opacity(self, opacity):
+        self.opacity = opacity
+        for item in self._items.values():
+            item.setOpacity(opacity)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _fit(width, height):
+        """Plot rectangle ``(x, y, w, h)`` of an image centred in PLOT_BOUNDS."""
+        x0, y0, bounds_w, bounds_h = PLOT_BOUNDS
+        scale = min(bounds_w / width, bounds_h / height)
+        w, h = width * scale, height * scale
+        return (x0 + (bounds_w - w) / 2, y0 + (bounds_h - h) / 2, w, h)
+
+    def _tile_rect(self, level, tx, ty, shape):
+        """Plot rectangle of a tile of ``shape`` (rows, columns)."""
+        x, y, w, _ = self.rect
+        unit = w / self.source.width * 2 ** level
+        top = y + self.rect[3]
+        return QtCore.QRectF(x + tx * TILE_SIZE * unit, top - (ty * TILE_SIZE + shape[0]) * unit,
+                             shape[1] * unit, shape[0] * unit)
+
+    def update_view(self, view_range, pixel_size):
+        """Show the tiles needed for ``view_range`` at ``pixel_size`` plot units."""
+        self._view = (view_range, pixel_size)
+        if self.source is None or not pixel_size > 0:
+            return
+        source = self.source
+        x, y, w, h = self.rect
+        unit = w / source.width
+        level = int(math.floor(math.log2(max(pixel_size / unit, 1))))
+        level = min(max(level, source.min_level), source.levels - 1)
+
+        # View range in pixels of the chosen level, rows counted from the top
+        level_unit = unit * 2 ** level
+        (x_min, x_max), (y_min, y_max) = view_range
+        columns, rows = source.tile_count(level)
+        tx0 = max(0, math.floor((x_min - x) / level_unit / TILE_SIZE))
+        tx1 = min(columns - 1, math.floor((x_max - x) / level_unit / TILE_SIZE))
+        ty0 = max(0, math.floor((y + h - y_max) / level_unit / TILE_SIZE))
+        ty1 = min(rows - 1, math.floor((y + h - y_min) / level_unit / TILE_SIZE))
+
+        wanted = {}
+        for tx in range(tx0, tx1 + 1):
+            for ty in range(ty0, ty1 + 1):
+                key = (level, tx, ty)
+                if source.in_memory and key not in self.cache:
+                    self.cache.put(key, source.read(*key)[key])
+                if key in self.cache:
+                    wanted[key] = key
+                    continue
+                self._request(key)
+                fallback = self._cached_ancestor(key)
+                if fallback is not None:
+                    wanted.setdefault(fallback, fallback)
+        self._show(wanted)
+
+    def _cached_ancestor(self, key):
+        level, tx, ty = key
+        for parent in range(level + 1, self.source.levels):
+            shift = parent - level
+            candidate = (parent, tx >> shift, ty >> shift)
+            if candidate in self.cache:
+                return candidate
+        return None
+
+    def _show(self, keys):
+        for key in list(self._items):
+            if key not in keys:
+                self.plot_widget.removeItem(self._items.pop(key))
+        for key in keys:
+            if key in self._items:
+                continue
+            tile = self.cache.get(key)
+            # Rows are stored top down while the plot's y axis points up
+            item = pg.ImageItem(np.flipud(tile), axisOrder='row-major', levels=(0, 255))
+            item.setRect(self._tile_rect(*key, tile.shape))
+            item.setZValue(OVERLAY_Z - key[0] * 0.01)
+            item.setOpacity(self.opacity)
+            self.plot_widget.addItem(item)
+            self._items[key] = item
+
+    def _request(self, key):
+        # Formats without partial decoding load a whole level per request
+        request = key if self.source.partial else key[:1]
+        with self._lock:
+            if request in self._pending or request in self._failed:
+                return
+            self._pending.add(request)
+        self._pool.submit(self._load, self.source, request, key)
+
+    def _load(self, source, request, key):
+        try:
+            tiles = source.read(*key)
+        except ValueError:
+            tiles = None
+        self.tiles_loaded.emit(source, (request, tiles))
+
+    def _on_tiles_loaded(self, source, loaded):
+        if source is not self.source:
+            return
+        request, tiles = loaded
+        with self._lock:
+            self._pending.discard(request)
+            if tiles is None:
+                self._failed.add(request)
+        for key, tile in (tiles or {}).items():
+            self.cache.put(key, tile)
+        if self._view is not None:
+            self.update_view(*self._view)
+
+
+class ReprojectedOverlay(QtCore.QObject):
+    """Keep an image warped from its own projection into the plot's.
+
+    :meth:`request` is called with every new projection and rotation; the
+    warp runs on a background thread, requests superseded before they start
+    are skipped, and remap tables are cached per rotation so returning to a
+    slider position only resamples the image.
+    """
+
+    reprojected = QtCore.pyqtSignal(object)
+
+    def __init__(self, layer, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.cache = RemapCache()
+        self.image = None
+        self.src_projection = None
+        self._last = None
+        self._latest = 0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='overlay-reprojection')
+        self.reprojected.connect(self._on_reprojected)
+
+    @property
+    def active(self):
+        return self.image is not None
+
+    def set_image(self, path, src_projection):
+        """Warp the image at ``path``, which shows the sphere in ``src_projection``."""
+        self.image = read_image(path, REPROJECTION_SOURCE_SIZE)
+        self.src_projection = src_projection
+        self._last = None
+
+    def clear(self):
+        self.image = None
+        self._last = None
+        self._latest += 1
+
+    def request(self, dst_projection, R, rotation_key):
+        """Warp the image for a new projection and rotation."""
+        if self.image is None or self._last == (dst_projection, rotation_key):
+            return
+        self._last = (dst_projection, rotation_key)
+        self._latest += 1
+        self._pool.submit(self._reproject, self._latest, self.image, self.src_projection,
+                          dst_projection, np.array(R), rotation_key)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _reproject(self, generation, image, src_projection, dst_projection, R, rotation_key):
+        if generation != self._latest:
+            return
+        pixels, extent = reproject_image(image, src_projection, dst_projection, R,
+                                         REPROJECTION_SIZE, self.cache, rotation_key)
+        self.reprojected.emit((generation, pixels, extent))
+
+    def _on_reprojected(self, result):
+        generation, pixels, extent = result
+        if generation == self._latest:
+            self.layer.set_source(ArrayTileSource(pixels, extent))
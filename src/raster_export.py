@@ -0,0 +1,144 @@
+"""Render projected guidelines to PNG files of any size, band by band."""
+import struct
+import zlib
+
+import numpy as np
+from PyQt5 import QtCore, QtGui
+import pyqtgraph as pg
+
+from core.constants import LINE_WIDTH
+from core.clipping import clip_polylines
+from core.scene import default_view_rect
+
+# Pixels rendered per band; bounds memory use independently of the image size
+BAND_PIXELS = 8 * 2 ** 20
+# Output width the default line width is chosen for, as on screen
+REFERENCE_WIDTH = 1000
+
+
+class PngWriter:
+    """Write an RGB PNG row band by row band without holding the whole image.
+
+    The default compression ``level`` favours speed: guideline images are
+    mostly flat background, which compresses well even at level 1.
+    """
+
+    def __init__(self, path, width, height, level=1):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(level)
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        # 8-bit truecolor, no interlacing
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def write_rows(self, rows):
+        """Append ``(n, width, 3)`` uint8 rows."""
+        n = len(rows)
+        # Every row starts with its filter type; 0 leaves the bytes as they are
+        raw = np.zeros((n, 1 + 3 * self.width), dtype=np.uint8)
+        raw[:, 1:] = rows.reshape(n, -1)
+        data = self._compressor.compress(raw)
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_written += n
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f'wrote {self.rows_written} of {self.height} rows')
+            self._chunk(b'IDAT', self._compressor.flush())
+            self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def image_rows(image):
+    """Return the pixels of a Format_RGB888 QImage as ``(h, w, 3)`` uint8."""
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * image.height())
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :3 * image.width()].reshape(image.height(), image.width(), 3)
+
+
+def _pen(color, width):
+    qcolor = QtGui.QColor(*[int(c * 255) for c in color[:3]])
+    pen = QtGui.QPen(qcolor, width)
+    pen.setCapStyle(QtCore.Qt.RoundCap)
+    pen.setJoinStyle(QtCore.Qt.RoundJoin)
+    # Widths are in output pixels, independent of the plot transform
+    pen.setCosmetic(True)
+    return pen
+
+
+def export_png(scene, path, width, view_rect=None, line_width=None,
+               background=(1, 1, 1), band_pixels=BAND_PIXELS, progress=None):
+    """Render a :class:`core.scene.Scene` to a PNG ``width`` pixels wide.
+
+    ``view_rect`` ``(x0, y0, x1, y1)`` is the plot area shown (by default the
+    plot bounds with a small margin) and sets the height.  Lines are drawn
+    ``line_width`` pixels wide, by default scaled from the on-screen width.
+    The image is rendered in horizontal bands of about ``band_pixels``
+    pixels, each clipped and drawn separately and streamed to the file, so
+    memory use does not grow with the image.  ``progress(rows_done, height)``
+    is called after every band.
+    """
+    x0, y0, x1, y1 = view_rect or default_view_rect()
+    height = max(1, round(width * (y1 - y0) / (x1 - x0)))
+    scale = width / (x1 - x0)
+    if line_width is None:
+        line_width = LINE_WIDTH * max(1.0, width / REFERENCE_WIDTH)
+    outline_width = 3 * line_width
+    # Clip a little outside each band so thick pens are not cut at its edges
+    margin = outline_width / scale
+
+    layers = [(np.asarray(scene.outline[0], dtype=np.float64),
+               np.asarray(scene.outline[1], dtype=np.float64),
+               _pen((0, 0, 0), outline_width))]
+    layers += [(s.x, s.y, _pen(s.color, line_width)) for s in scene.sets]
+    fill = QtGui.QColor(*[int(c * 255) for c in background[:3]])
+
+    band_rows = max(1, min(height, band_pixels // width))
+    image = QtGui.QImage(width, band_rows, QtGui.QImage.Format_RGB888)
+    with PngWriter(path, width, height) as writer:
+        for top in range(0, height, band_rows):
+            rows = min(band_rows, height - top)
+            image.fill(fill)
+            band_y1 = y1 - top / scale
+            band_y0 = y1 - (top + rows) / scale
+            clip = (x0 - margin, band_y0 - margin, x1 + margin, band_y1 + margin)
+
+            painter = QtGui.QPainter(image)
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            # Plot coordinates to band pixels, y pointing down
+            painter.setTransform(QtGui.QTransform(scale, 0, 0, -scale, -x0 * scale, band_y1 * scale))
+            for x, y, pen in layers:
+                cx, cy = clip_polylines(x, y, clip)
+                if not len(cx):
+                    continue
+                painter.setPen(pen)
+                painter.drawPath(pg.arrayToQPath(cx, cy, connect='finite'))
+            painter.end()
+
+            writer.write_rows(image_rows(image)[:rows])
+            if progress is not None:
+                progress(top + rows, height)
+    return width, height
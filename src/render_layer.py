@@ -0,0 +1,161 @@
+import numpy as np
+from PyQt5 import QtGui
+import pyqtgraph as pg
+
+from core.constants import r, LINE_WIDTH
+from core.clipping import clip_polylines
+from gl_lines import GLLineItem
+
+
+def make_line_pen(color):
+    """Build the pen used to draw a line set of the given RGBA color."""
+    qcolor = QtGui.QColor(*[int(c * 255) for c in color[:3]])
+    return pg.mkPen(qcolor, width=LINE_WIDTH)
+
+
+class ProjectionRenderLayer:
+    """Retained plot items for the 2D projection.
+
+    Every line set is drawn by a single long-lived ``PlotDataItem`` whose
+    lines are separated by NaN gaps.  Items are created when a set first
+    appears, removed when it disappears and otherwise only receive new data
+    through ``setData``.  A set is only redrawn when its projected arrays,
+    the clip rectangle or the projection changed.
+    """
+
+    def __init__(self, plot_widget):
+        self.plot_widget = plot_widget
+        self.outline = self._create_outline()
+        self._items = {}
+        self._colors = {}
+        self._layouts = {}
+        # Inputs of the last update of each set
+        self._drawn = {}
+        self.projection = None
+        self.clip_rect = None
+
+    def __contains__(self, set_id):
+        return set_id in self._items
+
+    def _create_outline(self):
+        outline = pg.PlotDataItem(pen=pg.mkPen('k', width=3 * LINE_WIDTH))
+        self.plot_widget.addItem(outline)
+        return outline
+
+    def _create_item(self, color):
+        item = pg.PlotDataItem(pen=make_line_pen(color), connect='finite')
+        self.plot_widget.addItem(item)
+        return item
+
+    def _set_item_color(self, item, color):
+        item.setPen(make_line_pen(color))
+
+    def _remove_item(self, item):
+        self.plot_widget.removeItem(item)
+
+    def close(self):
+        """Remove every item of the layer from the plot."""
+        for set_id in list(self._items):
+            self._remove_item(self._items.pop(set_id))
+        self.plot_widget.removeItem(self.outline)
+
+    def set_projection(self, projection):
+        """Switch the outline and seam handling to a registered projection."""
+        if projection is self.projection:
+            return
+        self.projection = projection
+        self.outline.setData(*projection.outline(r))
+
+    def set_clip_rect(self, rect):
+        """Clip lines to ``(x_min, y_min, x_max, y_max)``, or not at all if None."""
+        self.clip_rect = rect
+
+    def sync(self, line_sets):
+        """Create, remove, recolor and show/hide items to match ``line_sets``."""
+        current = {set_data['id']: set_data for set_data in line_sets}
+        for set_id in list(self._items):
+            if set_id not in current:
+                self._remove_item(self._items.pop(set_id))
+                self._colors.pop(set_id, None)
+                self._layouts.pop(set_id, None)
+                self._drawn.pop(set_id, None)
+
+        for set_id, set_data in current.items():
+            color = tuple(set_data['color'])
+            item = self._items.get(set_id)
+            if item is None:
+                item = self._items[set_id] = self._create_item(color)
+                self._colors[set_id] = color
+            elif self._colors[set_id] != color:
+                self._set_item_color(item, color)
+                self._colors[set_id] = color
+            item.setVisible(set_data['visible'])
+
+    def _layout(self, set_id, line_offsets):
+        """Return NaN-prefilled buffers and the scatter index for a set."""
+        layout = self._layouts.get(set_id)
+        if layout is None or layout[0] is not line_offsets:
+            lengths = np.diff(line_offsets)
+            n_lines = len(lengths)
+            index = np.arange(line_offsets[-1]) + np.repeat(np.arange(n_lines), lengths)
+            size = int(line_offsets[-1]) + max(n_lines - 1, 0)
+            x_buf = np.full(size, np.nan)
+            y_buf = np.full(size, np.nan)
+            layout = (line_offsets, index, x_buf, y_buf)
+            self._layouts[set_id] = layout
+        return layout
+
+    def update_set(self, set_id, x, y, line_offsets):
+        """Update the item of a set with its projected, packed coordinates.
+
+        ``x`` and ``y`` hold every point of the set back to back and
+        ``line_offsets`` marks where each line starts and ends.
+        """
+        drawn = self._drawn.get(set_id)
+        if (drawn is not None and drawn[0] is x and drawn[1] is y
+                and drawn[2] == self.clip_rect and drawn[3] is self.projection):
+            return
+        self._drawn[set_id] = (x, y, self.clip_rect, self.projection)
+        _, index, x_buf, y_buf = self._layout(set_id, line_offsets)
+        x_buf[index] = x
+        y_buf[index] = y
+        wrap_width = self.projection.wrap_width if self.projection is not None else None
+        if wrap_width:
+            # Break lines where they jump across the seam of a wrapping projection
+            with np.errstate(invalid='ignore'):
+                seam = np.abs(np.diff(x_buf)) > wrap_width / 2
+            x_buf[1:][seam] = np.nan
+            y_buf[1:][seam] = np.nan
+        if self.clip_rect is not None:
+            self._items[set_id].setData(*clip_polylines(x_buf, y_buf, self.clip_rect), connect='finite')
+        else:
+            self._items[set_id].setData(x_buf, y_buf, connect='finite')
+
+
+class GLProjectionRenderLayer(ProjectionRenderLayer):
+    """Render layer drawing the outline and every set through one :class:`GLLineItem`.
+
+    The plot viewport must be a QOpenGLWidget for the GPU path; otherwise
+    the item paints with QPainter.
+    """
+
+    def __init__(self, plot_widget):
+        self.lines_item = GLLineItem()
+        plot_widget.addItem(self.lines_item)
+        super().__init__(plot_widget)
+
+    def _create_outline(self):
+        return self.lines_item.add_layer((0, 0, 0, 1), 3 * LINE_WIDTH)
+
+    def _create_item(self, color):
+        return self.lines_item.add_layer(color, LINE_WIDTH)
+
+    def _set_item_color(self, item, color):
+        item.set_color(color)
+
+    def _remove_item(self, item):
+        self.lines_item.remove_layer(item)
+
+    def close(self):
+        self._items.clear()
+        self.plot_widget.removeItem(self.lines_item)
@@ -0,0 +1,68 @@
+import time
+
+from PyQt5 import QtCore, QtGui
+
+
+class RenderScheduler(QtCore.QObject):
+    """Coalesce render requests into at most one render per display refresh.
+
+    Handlers mark stages dirty with :meth:`request`; the stages run in their
+    registration order on the next frame boundary and always read the latest
+    state.  A stage requested while an earlier one is running (e.g. the 3D
+    stage requesting the 2D stage) is handled in the same frame.
+    """
+
+    def __init__(self, stages, parent=None):
+        super().__init__(parent)
+        self._stages = list(stages)
+        self._dirty = set()
+        self._rendering = False
+        self._last_frame = 0.0
+        self.interval = 1 / 60
+        # Requests merged into an already pending frame
+        self.coalesced_requests = 0
+        # Refresh slots missed because a frame took longer than the interval
+        self.dropped_frames = 0
+        self.frame_count = 0
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self.render)
+
+        screen = QtGui.QGuiApplication.primaryScreen()
+        if screen is not None:
+            self.set_refresh_rate(screen.refreshRate())
+
+    def set_refresh_rate(self, hz):
+        """Pace frames to a display refreshing ``hz`` times per second."""
+        self.interval = 1 / min(max(hz or 60, 30), 240)
+
+    def request(self, stage):
+        """Mark ``stage`` dirty and make sure a frame is scheduled."""
+        if stage in self._dirty:
+            self.coalesced_requests += 1
+            return
+        self._dirty.add(stage)
+        if not self._rendering and not self._timer.isActive():
+            wait = self.interval - (time.perf_counter() - self._last_frame)
+            self._timer.start(max(0, int(wait * 1000)))
+
+    def render(self):
+        """Run every dirty stage once, in order."""
+        self._timer.stop()
+        start = time.perf_counter()
+        self._rendering = True
+        try:
+            for name, callback in self._stages:
+                if name in self._dirty:
+                    self._dirty.discard(name)
+                    callback()
+        finally:
+            self._rendering = False
+        end = time.perf_counter()
+        self.frame_count += 1
+        self.dropped_frames += int((end - start) // self.interval)
+        self._last_frame = end
+        if self._dirty:
+            self._timer.start(int(self.interval * 1000))
@@ -0,0 +1,342 @@
+"""Serve guideline images over HTTP for pipelines that cannot run the GUI.
+
+    python src/server.py --port 8765
+
+    GET  /render?projection=Stereographic&pan=30&width=2000&format=png
+    POST /render  {"projection": "Equirectangular", "rotation": {"tilt": 10},
+                   "line_sets": [...], "width": 4000, "format": "svg"}
+
+``format`` is ``png``, ``svg`` or ``pdf``; the other parameters are
+``projection``, ``rotation`` (or ``tilt``, ``roll``, ``pan`` in a query) in
+degrees, ``width``, ``view``, ``line_width``, ``tolerance`` and
+``line_sets`` (dicts as in project files; the default sets when omitted).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from core.projection import PROJECTIONS
+from core.scene import ROTATION_KEYS, default_line_sets, default_view_rect, line_set
+from core.vector_export import DEFAULT_TOLERANCE
+from export import export_raster, export_vector
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+DEFAULT_WIDTHS = {'png': 2000, 'svg': 1000, 'pdf': 1000}
+MAX_WIDTH = 20000
+MAX_DIVISIONS = 1000
+# Largest request body accepted, in bytes
+MAX_BODY = 2 ** 20
+
+
+class RequestError(ValueError):
+    """Raised for render parameters that cannot be used; answered with 400."""
+
+
+def _number(value, name):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(f'{name} must be a number') from None
+    if value != value or value in (float('inf'), float('-inf')):
+        raise RequestError(f'{name} must be finite')
+    # Equal angles written differently must share a cache entry
+    return round(value, 9) + 0.0
+
+
+def _integer(value, name):
+    value = _number(value, name)
+    if value != int(value):
+        raise RequestError(f'{name} must be an integer')
+    return int(value)
+
+
+def _numbers(values, count, name):
+    if not isinstance(values, (list, tuple)) or len(values) not in count:
+        raise RequestError(f'{name} must be a list of {" or ".join(map(str, count))} numbers')
+    return [_number(v, name) for v in values]
+
+
+def normalize_request(params):
+    """Validate render parameters and fill in defaults.
+
+    Returns a dict with every parameter spelled out in one canonical form,
+    so requests for the same image normalize to the same dict.  Invisible
+    line sets are dropped and set names, which do not show in the output,
+    are kept only for SVG and PDF layers.
+    """
+    fmt = str(params.get('format', 'png')).lower()
+    if fmt not in CONTENT_TYPES:
+        raise RequestError(f'format must be one of {", ".join(CONTENT_TYPES)}')
+    projection = params.get('projection', 'Orthographic')
+    if projection not in PROJECTIONS:
+        raise RequestError(f'unknown projection {projection!r}')
+
+    rotation = params.get('rotation', {})
+    if not isinstance(rotation, dict):
+        raise RequestError('rotation must be an object')
+    rotation = {key: _number(rotation.get(key, params.get(key, 0.0)), key) for key in ROTATION_KEYS}
+
+    width = _integer(params.get('width', DEFAULT_WIDTHS[fmt]), 'width')
+    if not 16 <= width <= MAX_WIDTH:
+        raise RequestError(f'width must be between 16 and {MAX_WIDTH}')
+
+    view = params.get('view')
+    view = _numbers(view, (4,), 'view') if view is not None else list(default_view_rect())
+    if view[2] <= view[0] or view[3] <= view[1]:
+        raise RequestError('view must be x0, y0, x1, y1 with x1 > x0 and y1 > y0')
+
+    line_width = params.get('line_width')
+    if line_width is not None:
+        line_width = _number(line_width, 'line_width')
+        if line_width <= 0:
+            raise RequestError('line_width must be positive')
+    tolerance = _number(params.get('tolerance', DEFAULT_TOLERANCE), 'tolerance')
+    if tolerance <= 0:
+        raise RequestError('tolerance must be positive')
+
+    raw_sets = params.get('line_sets')
+    if raw_sets is None:
+        raw_sets = default_line_sets()
+    if not isinstance(raw_sets, list):
+        raise RequestError('line_sets must be a list')
+    sets = []
+    for entry in raw_sets:
+        if not isinstance(entry, dict):
+            raise RequestError('every line set must be an object')
+        visible = entry.get('visible', True)
+        if not isinstance(visible, bool):
+            raise RequestError('visible must be true or false')
+        if not visible:
+            continue
+        if 'divisions' not in entry:
+            raise RequestError('invalid line set: missing divisions')
+        divisions = _integer(entry['divisions'], 'divisions')
+        if not 1 <= divisions <= MAX_DIVISIONS:
+            raise RequestError(f'divisions must be between 1 and {MAX_DIVISIONS}')
+        try:
+            set_data = line_set(
+                str(entry.get('name', '')) if fmt != 'png' else '',
+                _numbers(entry['direction'], (2,), 'direction'),
+                divisions,
+                _numbers(entry.get('color', (0, 0, 0, 1)), (3, 4), 'color'),
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise RequestError(f'invalid line set: {exc}') from None
+        set_data['direction'] = list(set_data['direction'])
+        set_data['color'] = list(set_data['color'])
+        sets.append(set_data)
+
+    return {
+        'format': fmt,
+        'projection': projection,
+        'rotation': rotation,
+        'width': width,
+        'view': view,
+        'line_width': line_width,
+        'tolerance': tolerance if fmt != 'png' else None,
+        'line_sets': sets,
+    }
+
+
+def query_params(query):
+    """Render parameters of a query string; ``view`` is four comma-separated numbers."""
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    if 'view' in params:
+        params['view'] = params['view'].split(',')
+    return params
+
+
+def render(request):
+    """Render a normalized request and return the file contents."""
+    project = {key: request[key] for key in ('line_sets', 'rotation', 'projection')}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'render.' + request['format'])
+        if request['format'] == 'png':
+            export_raster(project, path, request['width'], request['view'], request['line_width'])
+        else:
+            export_vector(project, path, request['width'], request['view'], request['line_width'],
+                          request['tolerance'])
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class RenderCache:
+    """LRU cache of rendered files, bounded by their total size in bytes.
+
+    Renders are run on a pool and shared: concurrent requests for an image
+    that is still being rendered wait for that render instead of starting
+    another.
+    """
+
+    def __init__(self, workers=None, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Rendering spends most of its time in NumPy and Qt, which release the GIL
+        self._pool = ThreadPoolExecutor(workers or os.cpu_count() or 1)
+
+    def get(self, request):
+        """Return ``(data, cache_hit)`` for a normalized request, rendering it if needed."""
+        key = json.dumps(request, sort_keys=True)
+        with self._lock:
+            data = self._results.get(key)
+            if data is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return data, True
+            future = self._pending.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._pending[key] = Future()
+                owner = True
+            else:
+                self.hits += 1
+                owner = False
+        if not owner:
+            return future.result(), True
+
+        try:
+            data = self._pool.submit(render, request).result()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self._results[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes and len(self._results) > 1:
+                _, evicted = self._results.popitem(last=False)
+                self.nbytes -= len(evicted)
+        future.set_result(data)
+        return data, False
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """Answers ``/render`` requests from the server's :class:`RenderCache`."""
+
+    server_version = 'VaCPA'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != '/render':
+            self._send_error(404, 'not found')
+            return
+        self._render(query_params(url.query))
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/render':
+            self._send_error(404, 'not found')
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            if length < 0:
+                self._send_error(400, 'invalid Content-Length')
+            else:
+                self._send_error(413, 'request body is too large')
+            return
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            self._send_error(400, f'invalid JSON: {exc}')
+            return
+        if not isinstance(params, dict):
+            self._send_error(400, 'request body must be a JSON object')
+            return
+        self._render(params)
+
+    def _render(self, params):
+        try:
+            request = normalize_request(params)
+        except RequestError as exc:
+            self._send_error(400, str(exc))
+            return
+        try:
+            data, hit = self.server.cache.get(request)
+        except Exception as exc:
+            self._send_error(500, f'render failed: {exc}')
+            return
+        etag = '"' + hashlib.sha1(json.dumps(request, sort_keys=True).encode()).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[request['format']])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('X-Cache', 'hit' if hit else 'miss')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        body = json.dumps({'error': message}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """HTTP server rendering on a shared pool with a shared result cache."""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, cache_bytes=256 * 2 ** 20, quiet=False):
+        super().__init__(address, RenderHandler)
+        self.cache = RenderCache(workers, cache_bytes)
+        self.quiet = quiet
+
+    def server_close(self):
+        super().server_close()
+        self.cache.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, help='concurrent renders (default: one per core)')
+    parser.add_argument('--cache-mb', type=int, default=256, help='size of the result cache')
+    parser.add_argument('--quiet', action='store_true', help='do not log requests')
+    args = parser.parse_args(argv)
+
+    server = RenderServer((args.host, args.port), args.workers, args.cache_mb * 2 ** 20, args.quiet)
+    print(f'serving on http://{args.host}:{server.server_address[1]}/render', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
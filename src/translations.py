@@ -2,7 +2,36 @@ TRANSLATIONS = {
     'en': {
         'file_menu': 'File',
         'help_menu': 'Help',
+        'view_menu': 'View',
+        'open_overlay': 'Open Image Overlay...',
+        'open_overlay_title': 'Open Image Overlay',
+        'remove_overlay': 'Remove Image Overlay',
+        'overlay_projection': 'Overlay Projection',
+        'overlay_flat': 'Flat Image',
+        'overlay_file_filter': 'Images (*.png *.jpg *.jpeg *.tif *.tiff *.bmp *.webp)',
+        'overlay_error_title': 'Image Overlay',
+        'overlay_open_failed': 'Could not open the image:',
+        'performance_hud': 'Performance HUD',
+        'gpu_lines': 'GPU Line Rendering',
+        'gpu_lines_unavailable': 'OpenGL is not available; lines stay drawn with QPainter.',
+        'export_timings': 'Export Frame Timings...',
+        'export_timings_title': 'Export Frame Timings',
         'language_menu': 'Language',
+        'open_project': 'Open Project...',
+        'save_project': 'Save Project...',
+        'open_project_title': 'Open Project',
+        'save_project_title': 'Save Project',
+        'project_file_filter': 'VaCPA project (*.vacpa)',
+        'project_error_title': 'Project Error',
+        'project_open_failed': 'Could not open the project:',
+        'project_save_failed': 'Could not save the project:',
+        'export_image': 'Export Image...',
+        'export_image_title': 'Export Image',
+        'export_image_filter': 'PNG image (*.png);;SVG image (*.svg);;PDF document (*.pdf)',
+        'export_width_prompt': 'Image width in pixels:',
+        'export_page_width_prompt': 'Page width in points:',
+        'export_progress': 'Rendering image...',
+        'export_failed': 'Could not export:',
         'exit_action': 'Exit',
         'about_action': 'About',
         'language_english': 'English',
@@ -16,6 +45,10 @@ TRANSLATIONS = {
         'projection_orthographic': 'Orthographic',
         'projection_stereographic': 'Stereographic',
         'projection_azimuthal': 'Azimuthal',
+        'projection_equisolid': 'Equisolid',
+        'projection_equidistant': 'Equidistant Fisheye',
+        'projection_equirectangular': 'Equirectangular',
+        'adaptive_sampling': 'Adaptive sampling',
         'line_visible': 'Visible',
         'line_color': 'Color',
         'line_rename': 'Rename',
@@ -24,6 +57,7 @@ TRANSLATIONS = {
         'phi_label': 'Phi:',
         'divisions_label': 'Divisions:',
         'add_line_set': 'Add New Line Set',
+        'filter_line_sets': 'Filter line sets',
         'tilt': 'Tilt',
         'roll': 'Roll',
         'pan': 'Pan',
@@ -46,7 +80,36 @@ TRANSLATIONS = {
     'zh_CN': {
         'file_menu': '文件',
         'help_menu': '帮助',
+        'view_menu': '视图',
+        'open_overlay': '打开参考图像...',
+        'open_overlay_title': '打开参考图像',
+        'remove_overlay': '移除参考图像',
+        'overlay_projection': '参考图像投影',
+        'overlay_flat': '平面图像',
+        'overlay_file_filter': '图像 (*.png *.jpg *.jpeg *.tif *.tiff *.bmp *.webp)',
+        'overlay_error_title': '参考图像',
+        'overlay_open_failed': '无法打开图像：',
+        'performance_hud': '性能监视',
+        'gpu_lines': 'GPU 线条渲染',
+        'gpu_lines_unavailable': 'OpenGL 不可用，线条仍使用 QPainter 绘制。',
+        'export_timings': '导出帧耗时...',
+        'export_timings_title': '导出帧耗时',
         'language_menu': '语言',
+        'open_project': '打开项目...',
+        'save_project': '保存项目...',
+        'open_project_title': '打开项目',
+        'save_project_title': '保存项目',
+        'project_file_filter': 'VaCPA 项目 (*.vacpa)',
+        'project_error_title': '项目错误',
+        'project_open_failed': '无法打开项目：',
+        'project_save_failed': '无法保存项目：',
+        'export_image': '导出图像...',
+        'export_image_title': '导出图像',
+        'export_image_filter': 'PNG 图像 (*.png);;SVG 图像 (*.svg);;PDF 文档 (*.pdf)',
+        'export_width_prompt': '图像宽度（像素）：',
+        'export_page_width_prompt': '页面宽度（点）：',
+        'export_progress': '正在渲染图像...',
+        'export_failed': '无法导出：',
         'exit_action': '退出',
         'about_action': '关于',
         'language_english': '英语',
@@ -60,6 +123,10 @@ TRANSLATIONS = {
         'projection_orthographic': '正射投影',
         'projection_stereographic': '球极平面投影',
         'projection_azimuthal': '方位等距投影',
+        'projection_equisolid': '等立体角投影',
+        'projection_equidistant': '等距鱼眼投影',
+        'projection_equirectangular': '等距柱状投影',
+        'adaptive_sampling': '自适应采样',
         'line_visible': '切换可见度',
         'line_color': '颜色',
         'line_rename': '重命名',
@@ -68,6 +135,7 @@ TRANSLATIONS = {
         'phi_label': 'φ：',
         'divisions_label': '分割数：',
         'add_line_set': '添加新参考线',
+        'filter_line_sets': '筛选参考线',
         'tilt': '倾斜',
         'roll': '滚动',
         'pan': '平移',
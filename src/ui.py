@@ -4,7 +4,15 @@ import pyqtgraph.opengl as gl
 import numpy as np
 
 from translations import TRANSLATIONS
-from constants import PLOT_BOUNDS
+from core.constants import PLOT_BOUNDS
+from core.projection import PROJECTIONS, get_projection_object
+from render_layer import GLProjectionRenderLayer, ProjectionRenderLayer
+from line_model import LineSetModel
+from gl_lines import opengl_available, set_opengl_viewport
+from instrumentation import PerformanceHud
+from overlay import ImageOverlayLayer, ImageTileSource, ReprojectedOverlay
+from core.project_io import FILE_EXTENSION, load_project, save_project
+from export import export_raster, export_vector, is_vector_path
 
 
 class UIMixin:
@@ -31,8 +39,30 @@ class UIMixin:
             self.file_menu.setTitle(self.tr('file_menu'))
         if hasattr(self, 'help_menu'):
             self.help_menu.setTitle(self.tr('help_menu'))
+        if hasattr(self, 'view_menu'):
+            self.view_menu.setTitle(self.tr('view_menu'))
+        if hasattr(self, 'open_overlay_action'):
+            self.open_overlay_action.setText(self.tr('open_overlay'))
+        if hasattr(self, 'remove_overlay_action'):
+            self.remove_overlay_action.setText(self.tr('remove_overlay'))
+        if hasattr(self, 'overlay_projection_menu'):
+            self.overlay_projection_menu.setTitle(self.tr('overlay_projection'))
+            for key, action in self.overlay_projection_actions.items():
+                action.setText(self.tr(key))
+        if hasattr(self, 'gpu_lines_action'):
+            self.gpu_lines_action.setText(self.tr('gpu_lines'))
+        if hasattr(self, 'performance_hud_action'):
+            self.performance_hud_action.setText(self.tr('performance_hud'))
+        if hasattr(self, 'export_timings_action'):
+            self.export_timings_action.setText(self.tr('export_timings'))
         if hasattr(self, 'language_menu'):
             self.language_menu.setTitle(self.tr('language_menu'))
+        if hasattr(self, 'open_project_action'):
+            self.open_project_action.setText(self.tr('open_project'))
+        if hasattr(self, 'save_project_action'):
+            self.save_project_action.setText(self.tr('save_project'))
+        if hasattr(self, 'export_image_action'):
+            self.export_image_action.setText(self.tr('export_image'))
         if hasattr(self, 'exit_action'):
             self.exit_action.setText(self.tr('exit_action'))
         if hasattr(self, 'about_action'):
@@ -48,16 +78,19 @@ class UIMixin:
         if hasattr(self, 'rotation_group'):
             self.rotation_group.setTitle(self.tr('rotation_group'))
         if hasattr(self, 'toggle_3d_button'):
-            if self.view.isVisible():
+            if self.gl_view_active():
                 self.toggle_3d_button.setText(self.tr('hide_3d_view'))
             else:
                 self.toggle_3d_button.setText(self.tr('show_3d_view'))
         if hasattr(self, 'projection_label'):
             self.projection_label.setText(self.tr('projection_label'))
         if hasattr(self, 'projection_combo'):
-            self.projection_combo.setItemText(0, self.tr('projection_stereographic'))
-            self.projection_combo.setItemText(1, self.tr('projection_azimuthal'))
-            self.projection_combo.setItemText(2, self.tr('projection_orthographic'))
+            for index, projection in enumerate(PROJECTIONS.values()):
+                self.projection_combo.setItemText(index, self.tr(projection.label_key))
+        if hasattr(self, 'adaptive_check'):
+            self.adaptive_check.setText(self.tr('adaptive_sampling'))
+        if hasattr(self, 'line_filter'):
+            self.line_filter.setPlaceholderText(self.tr('filter_line_sets'))
         if hasattr(self, 'line_visible'):
             self.line_visible.setText(self.tr('line_visible'))
         if hasattr(self, 'line_color'):
@@ -115,10 +148,9 @@ class UIMixin:
         right_layout.setContentsMargins(10, 10, 10, 10)
         right_layout.setSpacing(10)
 
-        # 3D View
-        self.view = gl.GLViewWidget()
-        self.view.opts['distance'] = 5
-        # right_layout.addWidget(self.view, 1)
+        # 3D View, created on first use by toggle_3d_view
+        self.view = None
+        self.right_layout = right_layout
 
         # Controls section
         self.controls_box = QtWidgets.QGroupBox(self.tr('controls_group'))
@@ -126,9 +158,9 @@ class UIMixin:
         right_layout.addWidget(self.controls_box, 1)
 
         # Toggle 3D view button
-        self.toggle_3d_button = QtWidgets.QPushButton(self.tr('hide_3d_view'))
+        self.toggle_3d_button = QtWidgets.QPushButton(self.tr('show_3d_view'))
         self.toggle_3d_button.clicked.connect(self.toggle_3d_view)
-        # control_layout.addWidget(self.toggle_3d_button)
+        control_layout.addWidget(self.toggle_3d_button)
 
         # Rotation controls
         self.rotation_group = QtWidgets.QGroupBox(self.tr('rotation_group'))
@@ -155,14 +187,14 @@ class UIMixin:
         projection_layout = QtWidgets.QHBoxLayout()
         self.projection_label = QtWidgets.QLabel(self.tr('projection_label'))
         self.projection_combo = QtWidgets.QComboBox()
-        self.projection_combo.addItems([
-            self.tr('projection_stereographic'),
-            self.tr('projection_azimuthal'),
-            self.tr('projection_orthographic')
-        ])
+        for projection in PROJECTIONS.values():
+            self.projection_combo.addItem(self.tr(projection.label_key), projection.name)
         self.projection_combo.currentIndexChanged.connect(self.schedule_projection_update)
+        self.adaptive_check = QtWidgets.QCheckBox(self.tr('adaptive_sampling'))
+        self.adaptive_check.stateChanged.connect(self.schedule_projection_update)
         projection_layout.addWidget(self.projection_label)
         projection_layout.addWidget(self.projection_combo)
+        projection_layout.addWidget(self.adaptive_check)
         parent_layout.addLayout(projection_layout)
 
     def setup_projection_plot(self, parent_layout):
@@ -176,10 +208,31 @@ class UIMixin:
         self.plot_widget.setAspectLocked(True)
         parent_layout.addWidget(self.plot_widget, 1)
 
+        # Long-lived plot items, updated in place on every frame
+        self.render_layer = ProjectionRenderLayer(self.plot_widget)
+        self.image_overlay = ImageOverlayLayer(self.plot_widget, parent=self)
+        self.overlay_reprojection = ReprojectedOverlay(self.image_overlay, parent=self)
+        self.overlay_path = None
+        self.plot_widget.getViewBox().sigRangeChanged.connect(self.on_view_range_changed)
+        self.performance_hud = PerformanceHud(self.profiler, self.plot_widget, self.scheduler)
+
     def setup_line_management(self, parent_layout):
         """Setup UI for managing line sets"""
-        self.line_list = QtWidgets.QListWidget()
-        self.line_list.itemSelectionChanged.connect(self.on_line_selected)
+        self.line_filter = QtWidgets.QLineEdit()
+        self.line_filter.setPlaceholderText(self.tr('filter_line_sets'))
+        self.line_filter.setClearButtonEnabled(True)
+        self.line_filter.textChanged.connect(self.filter_line_list)
+        parent_layout.addWidget(self.line_filter)
+
+        self.line_model = LineSetModel(self.line_sets, self)
+        self.line_proxy = QtCore.QSortFilterProxyModel(self)
+        self.line_proxy.setSourceModel(self.line_model)
+        self.line_proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.line_list = QtWidgets.QListView()
+        self.line_list.setUniformItemSizes(True)
+        self.line_list.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.line_list.setModel(self.line_proxy)
+        self.line_list.selectionModel().selectionChanged.connect(self.on_line_selected)
         parent_layout.addWidget(self.line_list)
 
         # Line controls
@@ -200,7 +253,7 @@ class UIMixin:
         controls_layout.addWidget(self.rename_button, 1, 0)
 
         self.line_delete = QtWidgets.QPushButton(self.tr('line_delete'))
-        self.line_delete.clicked.connect(self.delete_selected_line_set)
+        self.line_delete.clicked.connect(self.delete_selected_line_sets)
         controls_layout.addWidget(self.line_delete, 1, 1)
 
         self.theta_label = QtWidgets.QLabel(self.tr('theta_label'))
@@ -235,29 +288,76 @@ class UIMixin:
         self.tilt_slider = self.create_slider(self.tr('tilt'), 0, np.pi/2, np.pi/180)
         parent_layout.addWidget(self.tilt_slider['label'])
         parent_layout.addWidget(self.tilt_slider['slider'])
-        self.tilt_slider['slider'].valueChanged.connect(self.update_3d)
+        self.tilt_slider['slider'].valueChanged.connect(self.schedule_3d_update)
 
         self.roll_slider = self.create_slider(self.tr('roll'), 0, np.pi/2, np.pi/180)
         parent_layout.addWidget(self.roll_slider['label'])
         parent_layout.addWidget(self.roll_slider['slider'])
-        self.roll_slider['slider'].valueChanged.connect(self.update_3d)
+        self.roll_slider['slider'].valueChanged.connect(self.schedule_3d_update)
 
         self.pan_slider = self.create_slider(self.tr('pan'), 0, np.pi/2, np.pi/180)
         parent_layout.addWidget(self.pan_slider['label'])
         parent_layout.addWidget(self.pan_slider['slider'])
-        self.pan_slider['slider'].valueChanged.connect(self.update_3d)
+        self.pan_slider['slider'].valueChanged.connect(self.schedule_3d_update)
 
     def setup_menu(self):
         """Setup application menu"""
         menubar = self.menuBar()
         self.file_menu = menubar.addMenu(self.tr('file_menu'))
+        self.view_menu = menubar.addMenu(self.tr('view_menu'))
         self.help_menu = menubar.addMenu(self.tr('help_menu'))
         self.language_menu = menubar.addMenu(self.tr('language_menu'))
 
+        self.open_project_action = QtWidgets.QAction(self.tr('open_project'), self)
+        self.open_project_action.setShortcut(QtGui.QKeySequence.Open)
+        self.open_project_action.triggered.connect(self.open_project_file)
+        self.file_menu.addAction(self.open_project_action)
+        self.save_project_action = QtWidgets.QAction(self.tr('save_project'), self)
+        self.save_project_action.setShortcut(QtGui.QKeySequence.Save)
+        self.save_project_action.triggered.connect(self.save_project_file)
+        self.file_menu.addAction(self.save_project_action)
+        self.file_menu.addSeparator()
+        self.export_image_action = QtWidgets.QAction(self.tr('export_image'), self)
+        self.export_image_action.triggered.connect(self.export_image)
+        self.file_menu.addAction(self.export_image_action)
+        self.file_menu.addSeparator()
+
         self.exit_action = QtWidgets.QAction(self.tr('exit_action'), self)
         self.exit_action.triggered.connect(self.close)
         self.file_menu.addAction(self.exit_action)
 
+        self.open_overlay_action = QtWidgets.QAction(self.tr('open_overlay'), self)
+        self.open_overlay_action.triggered.connect(self.open_image_overlay)
+        self.view_menu.addAction(self.open_overlay_action)
+        self.remove_overlay_action = QtWidgets.QAction(self.tr('remove_overlay'), self)
+        self.remove_overlay_action.triggered.connect(self.remove_image_overlay)
+        self.view_menu.addAction(self.remove_overlay_action)
+        # The projection the overlay image was made in; it is warped into the
+        # plot's projection unless it is a flat image
+        self.overlay_projection_menu = self.view_menu.addMenu(self.tr('overlay_projection'))
+        self.overlay_projection_group = QtWidgets.QActionGroup(self)
+        self.overlay_projection_actions = {}
+        for name in (None, *PROJECTIONS):
+            key = 'overlay_flat' if name is None else PROJECTIONS[name].label_key
+            action = QtWidgets.QAction(self.tr(key), self, checkable=True)
+            action.setData(name)
+            action.setChecked(name is None)
+            action.triggered.connect(self.apply_overlay_projection)
+            self.overlay_projection_group.addAction(action)
+            self.overlay_projection_menu.addAction(action)
+            self.overlay_projection_actions[key] = action
+        self.view_menu.addSeparator()
+
+        self.gpu_lines_action = QtWidgets.QAction(self.tr('gpu_lines'), self, checkable=True)
+        self.gpu_lines_action.toggled.connect(self.toggle_gpu_lines)
+        self.view_menu.addAction(self.gpu_lines_action)
+        self.performance_hud_action = QtWidgets.QAction(self.tr('performance_hud'), self, checkable=True)
+        self.performance_hud_action.toggled.connect(self.toggle_performance_hud)
+        self.view_menu.addAction(self.performance_hud_action)
+        self.export_timings_action = QtWidgets.QAction(self.tr('export_timings'), self)
+        self.export_timings_action.triggered.connect(self.export_frame_timings)
+        self.view_menu.addAction(self.export_timings_action)
+
         self.about_action = QtWidgets.QAction(self.tr('about_action'), self)
         self.about_action.triggered.connect(self.show_about)
         self.help_menu.addAction(self.about_action)
@@ -311,11 +411,202 @@ class UIMixin:
         data['on_val_change'] = on_val_change
         return data
 
+    def toggle_gpu_lines(self, checked):
+        """Draw the 2D lines with OpenGL instead of QPainter, or back"""
+        if checked and not opengl_available():
+            QtWidgets.QMessageBox.warning(self, self.tr('gpu_lines'), self.tr('gpu_lines_unavailable'))
+            self.gpu_lines_action.blockSignals(True)
+            self.gpu_lines_action.setChecked(False)
+            self.gpu_lines_action.blockSignals(False)
+            return
+        clip_rect = self.render_layer.clip_rect
+        self.render_layer.close()
+        uses_opengl = set_opengl_viewport(self.plot_widget, checked)
+        layer_class = GLProjectionRenderLayer if uses_opengl else ProjectionRenderLayer
+        self.render_layer = layer_class(self.plot_widget)
+        self.render_layer.set_clip_rect(clip_rect)
+        result = self.last_projection_result
+        if result is not None:
+            self.render_layer.set_projection(get_projection_object(result.projection))
+            self.show_projected_lines(result)
+
+    def toggle_performance_hud(self, checked):
+        """Start or stop recording frame timings and show them on the plot"""
+        self.profiler.set_enabled(checked)
+        self.performance_hud.set_active(checked)
+
+    def export_frame_timings(self):
+        """Save the recorded frame timings as CSV"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, self.tr('export_timings_title'), 'frame_timings.csv', 'CSV (*.csv)'
+        )
+        if path:
+            self.profiler.dump_csv(path)
+
+    def open_image_overlay(self):
+        """Show a reference image under the guidelines"""
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, self.tr('open_overlay_title'), '', self.tr('overlay_file_filter')
+        )
+        if path:
+            self.overlay_path = path
+            self.apply_overlay_projection()
+
+    def apply_overlay_projection(self):
+        """Show the overlay image flat or warped from its chosen projection"""
+        if self.overlay_path is None:
+            return
+        src_projection = self.overlay_projection_group.checkedAction().data()
+        try:
+            if src_projection is None:
+                self.overlay_reprojection.clear()
+                self.image_overlay.set_source(ImageTileSource(self.overlay_path))
+            else:
+                self.overlay_reprojection.set_image(self.overlay_path, src_projection)
+                self.overlay_reprojection.request(
+                    self.projection_combo.currentData(), self.current_rotation(), self.rotation_key()
+                )
+        except ValueError as exc:
+            self.remove_image_overlay()
+            QtWidgets.QMessageBox.warning(
+                self, self.tr('overlay_error_title'), f"{self.tr('overlay_open_failed')}\n{exc}"
+            )
+
+    def remove_image_overlay(self):
+        """Remove the reference image"""
+        self.overlay_path = None
+        self.overlay_reprojection.clear()
+        self.image_overlay.set_source(None)
+
+    def rotation_key(self):
+        """Hashable slider positions identifying the current rotation"""
+        return tuple(data['slider'].value() for data in (self.tilt_slider, self.roll_slider, self.pan_slider))
+
+    def rotation_axes(self):
+        """``(minimum, step, maximum position)`` of each rotation slider"""
+        return tuple(
+            (data['min'], data['step'], data['slider'].maximum())
+            for data in (self.tilt_slider, self.roll_slider, self.pan_slider)
+        )
+
+    def rotation_degrees(self):
+        """Return the slider rotation as ``{'tilt', 'roll', 'pan'}`` in degrees"""
+        return {
+            key: np.degrees(data['min'] + data['slider'].value() * data['step'])
+            for key, data in (('tilt', self.tilt_slider), ('roll', self.roll_slider), ('pan', self.pan_slider))
+        }
+
+    def set_rotation_degrees(self, rotation):
+        """Move the rotation sliders to angles given in degrees"""
+        for key, data in (('tilt', self.tilt_slider), ('roll', self.roll_slider), ('pan', self.pan_slider)):
+            if key in rotation:
+                value = (np.radians(rotation[key]) - data['min']) / data['step']
+                data['slider'].setValue(int(round(value)))
+
+    def save_project_file(self):
+        """Save the line sets, rotation and projection with their geometry"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, self.tr('save_project_title'), 'untitled' + FILE_EXTENSION, self.tr('project_file_filter')
+        )
+        if not path:
+            return
+        try:
+            save_project(path, self.line_sets, self.rotation_degrees(),
+                         self.projection_combo.currentData(), geometry=self.geometry)
+        except OSError as exc:
+            QtWidgets.QMessageBox.warning(
+                self, self.tr('project_error_title'), f"{self.tr('project_save_failed')}\n{exc}"
+            )
+
+    def current_project(self):
+        """Describe the scene the way a loaded project file does"""
+        return {
+            'line_sets': self.line_sets,
+            'rotation': self.rotation_degrees(),
+            'projection': self.projection_combo.currentData(),
+        }
+
+    def export_image(self):
+        """Render the projection to a PNG of any size, or write it as SVG or PDF"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, self.tr('export_image_title'), 'guidelines.png', self.tr('export_image_filter')
+        )
+        if not path:
+            return
+        if is_vector_path(path):
+            width, ok = QtWidgets.QInputDialog.getInt(
+                self, self.tr('export_image_title'), self.tr('export_page_width_prompt'), 1000, 16, 100000
+            )
+            if not ok:
+                return
+            try:
+                export_vector(self.current_project(), path, width)
+            except (OSError, ValueError) as exc:
+                QtWidgets.QMessageBox.warning(
+                    self, self.tr('export_image_title'), f"{self.tr('export_failed')}\n{exc}"
+                )
+            return
+        width, ok = QtWidgets.QInputDialog.getInt(
+            self, self.tr('export_image_title'), self.tr('export_width_prompt'), 4000, 16, 100000
+        )
+        if not ok:
+            return
+        dialog = QtWidgets.QProgressDialog(self.tr('export_progress'), None, 0, 100, self)
+        dialog.setWindowModality(QtCore.Qt.WindowModal)
+        dialog.setMinimumDuration(500)
+
+        def progress(done, total):
+            dialog.setValue(int(100 * done / total))
+            QtWidgets.QApplication.processEvents()
+
+        try:
+            export_raster(self.current_project(), path, width, progress=progress)
+        except (OSError, ValueError) as exc:
+            QtWidgets.QMessageBox.warning(
+                self, self.tr('export_image_title'), f"{self.tr('export_failed')}\n{exc}"
+            )
+        finally:
+            dialog.close()
+
+    def open_project_file(self):
+        """Replace the scene with one loaded from a project file"""
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, self.tr('open_project_title'), '', self.tr('project_file_filter')
+        )
+        if not path:
+            return
+        try:
+            project = load_project(path)
+        except (OSError, ValueError) as exc:
+            QtWidgets.QMessageBox.warning(
+                self, self.tr('project_error_title'), f"{self.tr('project_open_failed')}\n{exc}"
+            )
+            return
+        self.load_scene(project)
+
+    def gl_view_active(self):
+        """Whether the 3D view exists and is shown"""
+        return self.view is not None and self.view.isVisible()
+
     def toggle_3d_view(self):
-        """Toggle visibility of the 3D view"""
-        if self.view.isVisible():
+        """Toggle visibility of the 3D view
+
+        The GL widget and its items are only built the first time the view is
+        shown; sets edited while it was hidden are rebuilt when it reappears.
+        """
+        if self.gl_view_active():
             self.view.hide()
             self.toggle_3d_button.setText(self.tr('show_3d_view'))
-        else:
-            self.view.show()
-            self.toggle_3d_button.setText(self.tr('hide_3d_view'))
+            return
+
+        if self.view is None:
+            self.view = gl.GLViewWidget()
+            self.view.opts['distance'] = 5
+            self.right_layout.insertWidget(0, self.view, 1)
+        self.view.show()
+        self.toggle_3d_button.setText(self.tr('hide_3d_view'))
+        for set_data in self.line_sets:
+            if set_data.get('gl_dirty', True):
+                self.build_gl_items(set_data)
+        self.dirty_sets = None
+        self.update_3d()
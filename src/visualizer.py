@@ -1,14 +1,14 @@
+import os
 import sys
-import numpy as np
-from PyQt5 import QtWidgets, QtCore, QtGui
-import pyqtgraph as pg
+from PyQt5 import QtWidgets
 
-from constants import r, LINE_WIDTH
-from projection import (
-    get_rotation_matrices,
-    rotate_sphere_fast,
-    get_projection,
-)
+from core.constants import PLOT_BOUNDS, ADAPTIVE_TOLERANCE_PX
+from core.projection import get_projection_object
+from core.geometry import GeometryStore
+from core.lod import visible_tiles, zoom_level
+from instrumentation import FrameProfiler
+from scheduler import RenderScheduler
+from worker import FrameSnapshot, ProjectionWorker, SetLayout, slider_rotation
 
 from ui import UIMixin
 from line_manager import LineManagerMixin
@@ -24,12 +24,30 @@ class SphereProjectionVisualizer(UIMixin, LineManagerMixin, QtWidgets.QMainWindo
         self.setGeometry(100, 100, 1400, 900)
 
         self.line_sets = []
+        self.geometry = GeometryStore()
+        self.profiler = FrameProfiler()
         self.projection_needs_update = False
-
-        # Timer for delayed projection updates
-        self.update_timer = QtCore.QTimer()
-        self.update_timer.setSingleShot(True)
-        self.update_timer.timeout.connect(self.update_projection)
+        # Ids of the sets to re-rotate in the next 3D update; None for all
+        self.dirty_sets = None
+
+        # Rotation and projection for the 2D plot run on a background thread;
+        # results of outdated requests are discarded
+        self.projection_generation = 0
+        self.displayed_generation = 0
+        self.last_projection_result = None
+        # Zoom level of the 2D plot and, when zoomed in, the tiles in view
+        self.lod_level = 0
+        self.lod_tiles = ()
+        self.projection_worker = ProjectionWorker(self)
+        self.projection_worker.finished.connect(self.apply_projection_result)
+
+        # Slider and edit handlers only mark stages dirty; the scheduler
+        # renders them at most once per display refresh
+        self.scheduler = RenderScheduler([
+            ('3d', self.update_3d),
+            ('2d', self.update_projection),
+            ('items', self.update_line_items),
+        ], self)
 
         # Setup UI components
         self.setup_ui()
@@ -40,81 +58,155 @@ class SphereProjectionVisualizer(UIMixin, LineManagerMixin, QtWidgets.QMainWindo
         self.create_default_lines()
         self.update_3d()
         self.update_ui_texts()
+        if os.environ.get('VACPA_PROFILE'):
+            self.performance_hud_action.setChecked(True)
 
     # ------------------------------------------------------------------
+    def schedule_3d_update(self):
+        """Schedule a rotation of the scene for the next frame"""
+        self.dirty_sets = None
+        self.scheduler.request('3d')
+
+    def schedule_set_update(self, set_id):
+        """Schedule the rotation and projection of one edited line set"""
+        if self.dirty_sets is not None:
+            self.dirty_sets.add(set_id)
+        self.scheduler.request('3d')
+
+    def schedule_items_update(self):
+        """Schedule restyling the plot items after colors or visibility changed"""
+        self.scheduler.request('items')
+
     def schedule_projection_update(self):
-        """Schedule a projection update with delay"""
+        """Schedule a projection update for the next frame"""
         self.projection_needs_update = True
-        if not self.update_timer.isActive():
-            self.update_timer.start(25)  # Update after 200ms delay
+        self.profiler.start('queue')
+        self.scheduler.request('2d')
+
+    def current_rotation(self):
+        """Return the rotation matrix for the current slider positions"""
+        return slider_rotation(self.rotation_key(), self.rotation_axes())
 
     def update_3d(self):
         """Update the 3D view based on current parameters"""
-        tilt = self.tilt_slider['min'] + self.tilt_slider['slider'].value() * self.tilt_slider['step']
-        roll = self.roll_slider['min'] + self.roll_slider['slider'].value() * self.roll_slider['step']
-        pan = self.pan_slider['min'] + self.pan_slider['slider'].value() * self.pan_slider['step']
-
-        # Precompute rotation matrix once per frame
-        R = get_rotation_matrices(tilt, roll, pan)
-
-        for set_data in self.line_sets:
-            for obj in set_data['lines']:
-                x, y, z = obj['coords']
-                x_rot, y_rot, z_rot = rotate_sphere_fast(x, y, z, R)
-                pts = np.vstack([x_rot.flatten(), y_rot.flatten(), z_rot.flatten()]).T.astype(np.float32)
-                obj['line'].setData(pos=pts)
-                obj['rotated'] = (x_rot, y_rot, z_rot)
-
-        # Schedule projection update
+        # Rotate every line at once, or only the edited sets when the rotation
+        # did not change; per-line results are views into the store.
+        # The 2D worker rotates its own copy, so nothing needs rotating or
+        # uploading while the 3D view is hidden
+        if self.gl_view_active():
+            R = self.current_rotation()
+            keys = None
+            changed = self.line_sets
+            if self.dirty_sets is not None:
+                changed = [set_data for set_data in self.line_sets if set_data['id'] in self.dirty_sets]
+                keys = [set_data['id'] for set_data in changed]
+            with self.profiler.stage('rotate'):
+                self.geometry.rotate(R, keys)
+
+            with self.profiler.stage('gl_upload'):
+                for set_data in changed:
+                    line_views = self.geometry.line_views(set_data['id'])
+                    for item, pts in zip(set_data['gl_items'], line_views):
+                        item.setData(pos=pts)
+        self.dirty_sets = set()
+
+        # Schedule projection update; the worker reprojects only changed sets
         self.schedule_projection_update()
 
     def update_projection(self):
-        """Update the 2D projection based on current 3D view"""
+        """Submit the current view to the projection worker"""
         if not self.projection_needs_update:
             return
 
-        self.plot_widget.clear()
-        projection_index = self.projection_combo.currentIndex()
-        projection_types = ["Stereographic", "Azimuthal", "Orthographic"]
-        projection_type = (
-            projection_types[projection_index]
-            if projection_index < len(projection_types)
-            else "Orthographic"
-        )
+        self.profiler.stop('queue')
+        self.projection_generation += 1
+        snapshot = self.projection_snapshot()
+        self.projection_worker.submit(snapshot)
+        self.overlay_reprojection.request(snapshot.projection, snapshot.R, self.rotation_key())
+        self.projection_needs_update = False
 
-        # Draw sphere outline
-        t = np.linspace(0, 2 * np.pi, 100)
-        outline = pg.PlotDataItem(2 * np.cos(t), 2 * np.sin(t), pen=pg.mkPen('k', width=3 * LINE_WIDTH))
-        self.plot_widget.addItem(outline)
-
-        # Draw all visible lines
-        for set_data in self.line_sets:
-            if not set_data['visible']:
-                continue
-            for obj in set_data['lines']:
-                if 'rotated' not in obj:
-                    continue
-
-                x_rot, y_rot, z_rot = obj['rotated']
-                x_proj, y_proj = get_projection(x_rot, y_rot, z_rot, r, projection_type)
-
-                if projection_index == 0:
-                    mask = (1 - z_rot / r) < 0.01
-                    if mask.ndim > 0:
-                        x_proj = np.where(mask, np.nan, x_proj)
-                        y_proj = np.where(mask, np.nan, y_proj)
-
-                color = set_data['color']
-                qcolor = QtGui.QColor(*[int(c * 255) for c in color[:3]])
-
-                line_item = pg.PlotDataItem(
-                    x_proj, y_proj,
-                    pen=pg.mkPen(qcolor, width=LINE_WIDTH),
-                    connect='finite'
-                )
-                self.plot_widget.addItem(line_item)
+    def projection_snapshot(self):
+        """Capture everything the worker needs for one projection frame"""
+        sets = tuple(
+            SetLayout(
+                set_data['id'],
+                *self.geometry.block_range(set_data['id']),
+                self.geometry.line_offsets(set_data['id']),
+                tuple(set_data['direction']),
+                set_data['divisions'],
+                self.geometry.block_version(set_data['id']),
+            )
+            for set_data in self.line_sets if set_data['visible']
+        )
+        pixel_size = min(self.plot_widget.getViewBox().viewPixelSize())
+        if not pixel_size > 0:
+            pixel_size = PLOT_BOUNDS[2] / 1000
+        return FrameSnapshot(
+            generation=self.projection_generation,
+            coords=self.geometry.coords,
+            sets=sets,
+            R=self.current_rotation(),
+            projection=self.projection_combo.currentData() or "Orthographic",
+            adaptive=self.adaptive_check.isChecked(),
+            tolerance=ADAPTIVE_TOLERANCE_PX * pixel_size,
+            lod_level=self.lod_level,
+            tiles=self.lod_tiles,
+            rotation_key=self.rotation_key(),
+            rotation_axes=self.rotation_axes(),
+            scene_version=self.geometry.version,
+        )
 
-        self.projection_needs_update = False
+    def apply_projection_result(self, result):
+        """Show a frame computed by the projection worker"""
+        if result.generation != self.projection_generation:
+            return  # an outdated frame that finished after a newer request
+
+        self.profiler.add('project', result.elapsed)
+        with self.profiler.stage('projection'):
+            self.render_layer.set_projection(get_projection_object(result.projection))
+        with self.profiler.stage('items'):
+            self.show_projected_lines(result)
+        self.displayed_generation = result.generation
+        self.last_projection_result = result
+        self.profiler.end_frame()
+
+    def show_projected_lines(self, result):
+        """Update the plot items with the lines of a projection result"""
+        self.render_layer.sync(self.line_sets)
+        for set_id, (x_proj, y_proj, offsets) in result.lines.items():
+            if set_id in self.render_layer:
+                self.render_layer.update_set(set_id, x_proj, y_proj, offsets)
+
+    def update_line_items(self):
+        """Match the plot items' colors and visibility to the line sets"""
+        self.render_layer.sync(self.line_sets)
+
+    def on_view_range_changed(self, view_box, view_range):
+        """Re-clip the shown lines and update the level of detail"""
+        (x_min, x_max), (y_min, y_max) = view_range
+        # A small margin keeps thick pens from being cut at the border
+        margin = 0.02 * max(x_max - x_min, y_max - y_min)
+        self.render_layer.set_clip_rect((x_min - margin, y_min - margin, x_max + margin, y_max + margin))
+        self.image_overlay.update_view(view_range, min(view_box.viewPixelSize()))
+
+        level = zoom_level(view_range)
+        tiles = visible_tiles(view_range, level) if level > 0 else ()
+        if (level, tiles) != (self.lod_level, self.lod_tiles):
+            # Refine the newly visible tiles or decimate for the new zoom
+            self.lod_level, self.lod_tiles = level, tiles
+            self.schedule_projection_update()
+        elif self.adaptive_check.isChecked() and level <= 0:
+            # The sampling tolerance depends on the zoom level
+            self.schedule_projection_update()
+        elif self.last_projection_result is not None:
+            # Only re-clip; this is not a new frame for the profiler
+            self.show_projected_lines(self.last_projection_result)
+
+    def closeEvent(self, event):
+        self.projection_worker.stop()
+        self.image_overlay.close()
+        self.overlay_reprojection.close()
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
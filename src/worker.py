@@ -0,0 +1,347 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from PyQt5 import QtCore
+
+from core.constants import r
+from core.geometry import adaptive_longitude_family
+from core.lod import TileCache, decimate, join_pieces, refine_tile
+from core.projection import ProjectionWorkspace, get_projection, get_rotation_matrices, rotate_project
+
+# Slider steps around the current position prefetched on each axis
+PREFETCH_RADIUS = 2
+# Idle time after a frame before prefetching starts, in seconds
+PREFETCH_DELAY = 0.05
+
+
+class SetLayout(NamedTuple):
+    """Where one line set lives in the packed geometry, plus its definition.
+
+    ``version`` is the geometry store's version of the set's block; it
+    changes whenever the set's lines are regenerated.
+    """
+
+    id: int
+    start: int
+    stop: int
+    line_offsets: np.ndarray
+    direction: tuple
+    divisions: int
+    version: int = 0
+
+
+class FrameSnapshot(NamedTuple):
+    """Immutable inputs of one projection frame.
+
+    ``coords`` is the geometry store's packed, read-only base buffer; the
+    store allocates a new one whenever sets are added or removed, so a
+    snapshot never observes later edits.  ``lod_level`` is the zoom level of
+    the plot; above zero only the ``tiles`` in view are sampled, below zero
+    the fixed geometry is decimated.  ``rotation_key`` holds the slider
+    positions that ``R`` was built from and ``rotation_axes`` the
+    ``(minimum, step, maximum position)`` of each slider; with them, frames
+    are cached per position and neighbouring positions are prefetched.
+    ``scene_version`` is the geometry store's version.
+    """
+
+    generation: int
+    coords: np.ndarray
+    sets: tuple
+    R: np.ndarray
+    projection: str
+    adaptive: bool
+    tolerance: float
+    lod_level: int = 0
+    tiles: tuple = ()
+    rotation_key: tuple = None
+    rotation_axes: tuple = ()
+    scene_version: int = 0
+
+
+class FrameResult(NamedTuple):
+    """Projected lines of every set in a snapshot, keyed by set id."""
+
+    generation: int
+    projection: str
+    lines: dict
+    elapsed: float
+
+
+def slider_rotation(rotation_key, rotation_axes):
+    """Rotation matrix of the slider positions ``rotation_key``."""
+    return get_rotation_matrices(*(
+        minimum + position * step for position, (minimum, step, _) in zip(rotation_key, rotation_axes)
+    ))
+
+
+def neighbour_positions(rotation_key, rotation_axes, radius=PREFETCH_RADIUS):
+    """Slider positions up to ``radius`` steps away along one axis, nearest first."""
+    for distance in range(1, radius + 1):
+        for axis, (_, _, maximum) in enumerate(rotation_axes):
+            for sign in (1, -1):
+                position = rotation_key[axis] + sign * distance
+                if 0 <= position <= maximum:
+                    yield rotation_key[:axis] + (position,) + rotation_key[axis + 1:]
+
+
+class FrameCache:
+    """LRU cache of projected frames, bounded by their total number of points."""
+
+    def __init__(self, max_points=4_000_000):
+        self.max_points = max_points
+        self._frames = OrderedDict()
+        self._points = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
+
+    @staticmethod
+    def _size(lines):
+        return sum(len(x) for x, _, _ in lines.values())
+
+    def get(self, key):
+        lines = self._frames.get(key)
+        if lines is None:
+            self.misses += 1
+            return None
+        self._frames.move_to_end(key)
+        self.hits += 1
+        return lines
+
+    def put(self, key, lines):
+        old = self._frames.pop(key, None)
+        if old is not None:
+            self._points -= self._size(old)
+        self._frames[key] = lines
+        self._points += self._size(lines)
+        while self._points > self.max_points and len(self._frames) > 1:
+            _, evicted = self._frames.popitem(last=False)
+            self._points -= self._size(evicted)
+
+    def clear(self):
+        self._frames.clear()
+        self._points = 0
+
+
+def frame_key(snapshot, rotation_key=None):
+    """Cache key of a snapshot's frame at ``rotation_key`` (its own by default).
+
+    Zoomed-in frames are not cached here; their tiles are.
+    """
+    if snapshot.rotation_key is None or snapshot.lod_level > 0:
+        return None
+    return (
+        rotation_key or snapshot.rotation_key,
+        snapshot.projection,
+        snapshot.scene_version,
+        tuple(layout.id for layout in snapshot.sets),
+        snapshot.lod_level,
+        # The adaptive sampling tolerance follows the zoom
+        snapshot.tolerance if snapshot.adaptive else None,
+    )
+
+
+def frame_view(snapshot):
+    """What besides the sets themselves a snapshot's projected lines depend on."""
+    return (
+        snapshot.R.tobytes(),
+        snapshot.projection,
+        snapshot.lod_level,
+        snapshot.tiles,
+        snapshot.tolerance if snapshot.adaptive else None,
+    )
+
+
+class ProjectionWorker(QtCore.QObject):
+    """Rotate and project frames on a background thread.
+
+    Only the most recent snapshot is kept: submitting a new one replaces a
+    snapshot that has not started yet, adaptive frames give up between sets
+    once they are outdated, and results for outdated snapshots are dropped
+    instead of being emitted.
+
+    Frames are cached by slider position.  Once the worker has been idle for
+    ``PREFETCH_DELAY`` after a frame, it projects the neighbouring slider
+    positions into the cache, stopping as soon as a new snapshot arrives.
+
+    When only some sets changed since the previous frame (same rotation,
+    projection and zoom), the lines of the other sets are reused from it.
+    """
+
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._pending = None
+        self._latest = 0
+        self._stopped = False
+        self._work = ProjectionWorkspace()
+        # Only touched by the worker thread
+        self.tile_cache = TileCache()
+        self.frame_cache = FrameCache()
+        # View, set versions and lines of the last computed frame
+        self._last_frame = None
+        self.stale_frames = 0
+        self.prefetched_frames = 0
+        self._thread = threading.Thread(target=self._run, name='projection-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot):
+        """Queue ``snapshot``, replacing any snapshot still waiting."""
+        with self._condition:
+            if self._pending is not None:
+                self.stale_frames += 1
+            self._pending = snapshot
+            self._latest = snapshot.generation
+            self._condition.notify()
+
+    def stop(self):
+        """Stop the worker thread after the frame in flight."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=1)
+
+    def _is_stale(self, snapshot):
+        return snapshot.generation != self._latest or self._stopped
+
+    def _interrupted(self):
+        return self._pending is not None or self._stopped
+
+    def _run(self):
+        # The last frame shown, until its neighbours have been prefetched
+        idle = None
+        while True:
+            with self._condition:
+                if idle is not None and self._pending is None and not self._stopped:
+                    self._condition.wait(PREFETCH_DELAY)
+                if self._stopped:
+                    return
+                if self._pending is None and idle is not None:
+                    snapshot, idle = idle, None
+                    prefetch = True
+                else:
+                    while self._pending is None and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                    snapshot, self._pending = self._pending, None
+                    prefetch = False
+            if prefetch:
+                self.prefetch(snapshot)
+                continue
+            result = self.compute(snapshot)
+            if result is None or self._is_stale(snapshot):
+                with self._condition:
+                    self.stale_frames += 1
+                continue
+            self.finished.emit(result)
+            idle = snapshot
+
+    def compute(self, snapshot):
+        """Project one snapshot; returns None if it went stale midway."""
+        start = time.perf_counter()
+        key = frame_key(snapshot)
+        lines = self.frame_cache.get(key) if key is not None else None
+        if lines is None:
+            lines = self.project(snapshot, snapshot.R, lambda: self._is_stale(snapshot),
+                                 self.reusable_lines(snapshot))
+            if lines is None:
+                return None
+            if key is not None:
+                self.frame_cache.put(key, lines)
+        versions = {layout.id: layout.version for layout in snapshot.sets}
+        self._last_frame = (frame_view(snapshot), versions, lines)
+        return FrameResult(snapshot.generation, snapshot.projection, lines,
+                           time.perf_counter() - start)
+
+    def reusable_lines(self, snapshot):
+        """Lines of the last frame for the sets of ``snapshot`` that did not change."""
+        if self._last_frame is None:
+            return {}
+        view, versions, lines = self._last_frame
+        if view != frame_view(snapshot):
+            return {}
+        return {
+            layout.id: lines[layout.id] for layout in snapshot.sets
+            if versions.get(layout.id) == layout.version
+        }
+
+    def prefetch(self, snapshot):
+        """Cache the frames of the slider positions next to ``snapshot``'s."""
+        if frame_key(snapshot) is None:
+            return
+        for position in neighbour_positions(snapshot.rotation_key, snapshot.rotation_axes):
+            if self._interrupted():
+                return
+            key = frame_key(snapshot, position)
+            if key in self.frame_cache:
+                continue
+            R = slider_rotation(position, snapshot.rotation_axes)
+            lines = self.project(snapshot, R, self._interrupted)
+            if lines is None:
+                return
+            self.frame_cache.put(key, lines)
+            self.prefetched_frames += 1
+
+    def project(self, snapshot, R, is_stale, reuse=None):
+        """Project the sets of ``snapshot`` rotated by ``R``.
+
+        Sets found in ``reuse`` take their lines from it unchanged.  Returns
+        the lines keyed by set id, or None once ``is_stale()``.
+        """
+        lines = dict(reuse or {})
+        todo = [layout for layout in snapshot.sets if layout.id not in lines]
+
+        def project(x, y, z):
+            return get_projection(x, y, z, r, snapshot.projection)
+
+        if snapshot.lod_level > 0:
+            rotation_key = R.tobytes()
+            for layout in todo:
+                pieces = []
+                for ix, iy in snapshot.tiles:
+                    if is_stale():
+                        return None
+                    key = (layout.id, layout.direction, layout.divisions, rotation_key,
+                           snapshot.projection, snapshot.lod_level, ix, iy)
+                    tile = self.tile_cache.get(key)
+                    if tile is None:
+                        tile = refine_tile(layout, R, project, snapshot.lod_level, ix, iy)
+                        self.tile_cache.put(key, tile)
+                    pieces.append(tile)
+                x, y = join_pieces(pieces)
+                lines[layout.id] = (x, y, np.array([0, len(x)]))
+        elif snapshot.adaptive:
+            for layout in todo:
+                if is_stale():
+                    return None
+                lines[layout.id] = adaptive_longitude_family(
+                    layout.direction, layout.divisions, R, project, snapshot.tolerance
+                )
+        elif len(todo) == len(snapshot.sets):
+            # A fresh output array per frame: the GUI thread reads it while
+            # the next frame is being computed
+            projected = np.empty((len(snapshot.coords), 2), dtype=snapshot.coords.dtype)
+            rotate_project(snapshot.coords, R, r, snapshot.projection,
+                           out=projected, work=self._work)
+            for layout in todo:
+                block = projected[layout.start:layout.stop]
+                lines[layout.id] = decimate(block[:, 0], block[:, 1], layout.line_offsets,
+                                            2 ** -min(snapshot.lod_level, 0))
+        else:
+            for layout in todo:
+                block = rotate_project(snapshot.coords[layout.start:layout.stop], R, r,
+                                       snapshot.projection, work=self._work)
+                lines[layout.id] = decimate(block[:, 0], block[:, 1], layout.line_offsets,
+                                            2 ** -min(snapshot.lod_level, 0))
+        return lines